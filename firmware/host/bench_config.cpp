@@ -0,0 +1,86 @@
+#include <chrono>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+
+#include "EEPROM.h"
+#include "config_store.h"
+
+EEPROMClass EEPROM;
+
+typedef std::chrono::steady_clock Clock;
+
+static void check(bool condition, const char *message) {
+  if (!condition) {
+    fprintf(stderr, "FALHA: %s\n", message);
+    exit(1);
+  }
+}
+
+static Config makeConfig(uint16_t vid, uint16_t pid, const char *product, const char *manufacturer) {
+  Config config;
+  memset(&config, 0, sizeof(config));
+  config.vid = vid;
+  config.pid = pid;
+  strncpy(config.product_name, product, sizeof(config.product_name) - 1);
+  strncpy(config.manufacturer, manufacturer, sizeof(config.manufacturer) - 1);
+  return config;
+}
+
+static void report(const char *scenario, uint16_t written, double hostNs) {
+  printf("  %-28s writes=%-3lu eeprom=%6.1fms host=%.0fns\n",
+         scenario, EEPROM.writes, EEPROM.writeMicros / 1000.0, hostNs);
+  check(written == EEPROM.writes, "contagem de bytes divergente do mock");
+}
+
+static uint16_t timedSave(const Config *config, double *hostNs) {
+  EEPROM.resetCounters();
+  Clock::time_point start = Clock::now();
+  uint16_t written = configSave(config);
+  *hostNs = std::chrono::duration<double, std::nano>(Clock::now() - start).count();
+  return written;
+}
+
+int main() {
+  double ns;
+  Config loaded;
+  Config defaults = makeConfig(0x2341, 0x8036, "Arduino Leonardo", "Arduino");
+
+  printf("bench_config:\n");
+
+  EEPROM.erase();
+  check(configLoad(&loaded) == CONFIG_EMPTY, "EEPROM vazia aceita");
+  uint16_t written = timedSave(&defaults, &ns);
+  report("primeiro boot", written, ns);
+  check(written == sizeof(ConfigHeader) + sizeof(Config), "primeiro boot não gravou a config inteira");
+
+  check(configLoad(&loaded) == CONFIG_LOADED, "config recém-gravada rejeitada");
+  check(memcmp(&loaded, &defaults, sizeof(Config)) == 0, "config lida difere da gravada");
+
+  written = timedSave(&defaults, &ns);
+  report("SAVE sem mudanças", written, ns);
+  check(written == 0, "SAVE idêntico gravou bytes");
+
+  Config spoofed = makeConfig(0x046D, 0xC08B, "G502 HERO", "Logitech");
+  written = timedSave(&spoofed, &ns);
+  report("SAVE após SPOOF", written, ns);
+  check(written > 0 && written < sizeof(ConfigHeader) + sizeof(Config), "SAVE não foi incremental");
+
+  written = timedSave(&spoofed, &ns);
+  report("SAVE repetido", written, ns);
+  check(written == 0, "SAVE repetido gravou bytes");
+
+  EEPROM.cells[sizeof(ConfigHeader) + 5] ^= 0x55;
+  check(configLoad(&loaded) == CONFIG_EMPTY, "CRC inválido aceito");
+
+  EEPROM.erase();
+  memcpy(EEPROM.cells, &spoofed, sizeof(Config));
+  EEPROM.cells[68] = 1;
+  check(configLoad(&loaded) == CONFIG_MIGRATED, "layout antigo não migrado");
+  check(loaded.vid == 0x046D && strcmp(loaded.product_name, "G502 HERO") == 0, "migração perdeu dados");
+  written = timedSave(&loaded, &ns);
+  report("migração do layout v1", written, ns);
+  check(configLoad(&loaded) == CONFIG_LOADED, "config migrada rejeitada");
+
+  return 0;
+}
@@ -0,0 +1,133 @@
+#include <algorithm>
+#include <chrono>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <vector>
+
+#include "command_parser.h"
+#include "task_scheduler.h"
+
+typedef std::chrono::steady_clock Clock;
+
+static const char *SAMPLE_LINES[] = {
+  "STATUS\r\n",
+  "SPOOF 0x046D 0xC08B \"Logitech G502 HERO Gaming Mouse\" \"Logitech\"\n",
+  "  RESET  \n",
+  "TEST_MOUSE\n",
+  "SPOOF 1532 0084 \"Razer DeathAdder V2\"\n",
+  "FOO\n"
+};
+
+#define SAMPLE_COUNT (sizeof(SAMPLE_LINES) / sizeof(SAMPLE_LINES[0]))
+
+static void check(bool condition, const char *message) {
+  if (!condition) {
+    fprintf(stderr, "FALHA: %s\n", message);
+    exit(1);
+  }
+}
+
+static void sanityChecks() {
+  LineAssembler assembler;
+  lineAssemblerReset(&assembler);
+
+  const char *input = "  SPOOF 0x046D 0xC08B \"G502\" \"Logitech\"  \r\n";
+  LineStatus status = LINE_PENDING;
+  for (const char *p = input; *p && status != LINE_READY; p++) {
+    status = lineAssemblerFeed(&assembler, *p);
+  }
+  check(status == LINE_READY, "linha completa não detectada");
+  check(parseCommand(assembler.buffer) == CMD_SPOOF, "SPOOF não reconhecido");
+
+  SpoofArgs args;
+  check(parseSpoofArgs(assembler.buffer, &args) == SPOOF_PARSE_OK, "SPOOF inválido");
+  check(args.vid == 0x046D && args.pid == 0xC08B, "VID/PID incorretos");
+  check(strcmp(args.product, "G502") == 0, "produto incorreto");
+  check(strcmp(args.manufacturer, "Logitech") == 0, "fabricante incorreto");
+
+  check(parseSpoofArgs("SPOOF 0x046D", &args) == SPOOF_PARSE_INVALID_FORMAT, "formato aceito");
+  check(parseSpoofArgs("SPOOF 0xZZ 0x1 \"x\"", &args) == SPOOF_PARSE_INVALID_VID, "VID aceito");
+  check(parseSpoofArgs("SPOOF 0x1 0x12345 \"x\"", &args) == SPOOF_PARSE_INVALID_PID, "PID aceito");
+
+  lineAssemblerReset(&assembler);
+  status = LINE_PENDING;
+  for (int i = 0; i < LINE_BUFFER_SIZE * 2; i++) {
+    status = lineAssemblerFeed(&assembler, 'A');
+  }
+  check(status == LINE_PENDING, "overflow antecipado");
+  check(lineAssemblerFeed(&assembler, '\n') == LINE_OVERFLOW, "overflow não sinalizado");
+  check(assembler.length == 0, "buffer não reiniciado após overflow");
+}
+
+static unsigned long stepCount = 0;
+
+static unsigned long countingTask(unsigned long) {
+  stepCount++;
+  return stepCount < 5 ? 300 : TASK_DONE;
+}
+
+// Simula o loop() com relógio falso: comandos chegando enquanto a tarefa de
+// teste do mouse está ativa precisam ser tratados na mesma iteração.
+static void schedulerChecks() {
+  Task tasks[] = { { countingTask, 0, false } };
+  taskStart(&tasks[0], 0, 0);
+
+  unsigned long handledAt = 0;
+  LineAssembler assembler;
+  lineAssemblerReset(&assembler);
+  const char *command = "STATUS\n";
+  const char *next = command;
+
+  for (unsigned long now = 0; now < 2000; now++) {
+    if (now >= 100 && *next) {
+      if (lineAssemblerFeed(&assembler, *next++) == LINE_READY) {
+        handledAt = now;
+        lineAssemblerReset(&assembler);
+      }
+    }
+    schedulerRun(tasks, 1, now);
+  }
+  check(stepCount == 5, "tarefa não executou todos os passos");
+  check(!tasks[0].enabled, "tarefa não foi desativada");
+  check(handledAt - 100 < 10, "comando atrasado pelo escalonador");
+}
+
+int main() {
+  sanityChecks();
+  schedulerChecks();
+
+  const int iterations = 200000;
+  std::vector<double> samples;
+  samples.reserve(iterations);
+
+  LineAssembler assembler;
+  lineAssemblerReset(&assembler);
+  SpoofArgs args;
+  volatile unsigned checksum = 0;
+
+  for (int i = 0; i < iterations; i++) {
+    const char *line = SAMPLE_LINES[i % SAMPLE_COUNT];
+    Clock::time_point start = Clock::now();
+    for (const char *p = line; *p; p++) {
+      if (lineAssemblerFeed(&assembler, *p) == LINE_READY) {
+        CommandType type = parseCommand(assembler.buffer);
+        if (type == CMD_SPOOF && parseSpoofArgs(assembler.buffer, &args) == SPOOF_PARSE_OK) {
+          checksum += args.vid;
+        }
+        checksum += type;
+        lineAssemblerReset(&assembler);
+      }
+    }
+    samples.push_back(std::chrono::duration<double, std::nano>(Clock::now() - start).count());
+  }
+
+  std::sort(samples.begin(), samples.end());
+  printf("bench_parser: %d linhas\n", iterations);
+  printf("  p50=%.0fns p95=%.0fns p99=%.0fns max=%.0fns\n",
+         samples[iterations / 2],
+         samples[(size_t)(iterations * 0.95)],
+         samples[(size_t)(iterations * 0.99)],
+         samples.back());
+  return 0;
+}
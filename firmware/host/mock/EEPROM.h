@@ -0,0 +1,53 @@
+#ifndef EEPROM_MOCK_H
+#define EEPROM_MOCK_H
+
+#include <stdint.h>
+#include <string.h>
+
+// Substituto de <EEPROM.h> para o build nativo. Conta leituras e gravações
+// e acumula o tempo que as gravações levariam no ATmega32u4.
+
+#define EEPROM_MOCK_SIZE 1024
+#define EEPROM_MOCK_WRITE_US 3400UL
+
+class EEPROMClass {
+ public:
+  EEPROMClass() { erase(); }
+
+  uint8_t read(int address) {
+    reads++;
+    return cells[address];
+  }
+
+  void write(int address, uint8_t value) {
+    writes++;
+    writeMicros += EEPROM_MOCK_WRITE_US;
+    cells[address] = value;
+  }
+
+  void update(int address, uint8_t value) {
+    if (cells[address] != value) write(address, value);
+  }
+
+  uint16_t length() { return EEPROM_MOCK_SIZE; }
+
+  void erase() {
+    memset(cells, 0xFF, sizeof(cells));
+    resetCounters();
+  }
+
+  void resetCounters() {
+    reads = 0;
+    writes = 0;
+    writeMicros = 0;
+  }
+
+  uint8_t cells[EEPROM_MOCK_SIZE];
+  unsigned long reads;
+  unsigned long writes;
+  unsigned long writeMicros;
+};
+
+extern EEPROMClass EEPROM;
+
+#endif
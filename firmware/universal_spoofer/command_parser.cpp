@@ -0,0 +1,128 @@
+#include "command_parser.h"
+
+#include <stdlib.h>
+#include <string.h>
+
+static bool isSpace(char c) {
+  return c == ' ' || c == '\t';
+}
+
+static const char *skipSpaces(const char *p) {
+  while (isSpace(*p)) p++;
+  return p;
+}
+
+static const char *tokenEnd(const char *p) {
+  while (*p && !isSpace(*p)) p++;
+  return p;
+}
+
+void lineAssemblerReset(LineAssembler *assembler) {
+  assembler->length = 0;
+  assembler->overflow = false;
+  assembler->buffer[0] = '\0';
+}
+
+LineStatus lineAssemblerFeed(LineAssembler *assembler, char c) {
+  if (c == '\n' || c == '\r') {
+    if (assembler->overflow) {
+      lineAssemblerReset(assembler);
+      return LINE_OVERFLOW;
+    }
+    while (assembler->length > 0 && isSpace(assembler->buffer[assembler->length - 1])) {
+      assembler->length--;
+    }
+    if (assembler->length == 0) {
+      return LINE_PENDING;
+    }
+    assembler->buffer[assembler->length] = '\0';
+    return LINE_READY;
+  }
+
+  if (assembler->overflow) {
+    return LINE_PENDING;
+  }
+  if (assembler->length == 0 && isSpace(c)) {
+    return LINE_PENDING;
+  }
+  if (assembler->length >= LINE_BUFFER_SIZE - 1) {
+    assembler->overflow = true;
+    return LINE_PENDING;
+  }
+
+  assembler->buffer[assembler->length++] = c;
+  return LINE_PENDING;
+}
+
+CommandType parseCommand(const char *line) {
+  if (line == NULL || *line == '\0') return CMD_NONE;
+  if (strcmp(line, "STATUS") == 0) return CMD_STATUS;
+  if (strncmp(line, "SPOOF", 5) == 0) return CMD_SPOOF;
+  if (strcmp(line, "RESET") == 0) return CMD_RESET;
+  if (strcmp(line, "SAVE") == 0) return CMD_SAVE;
+  if (strcmp(line, "TEST_MOUSE") == 0) return CMD_TEST_MOUSE;
+  return CMD_UNKNOWN;
+}
+
+static bool parseHex16(const char *start, const char *end, uint16_t *value) {
+  if (end - start >= 2 && start[0] == '0' && (start[1] == 'x' || start[1] == 'X')) {
+    start += 2;
+  }
+  if (start == end || end - start > 4) return false;
+
+  uint16_t result = 0;
+  for (const char *p = start; p < end; p++) {
+    char c = *p;
+    uint8_t digit;
+    if (c >= '0' && c <= '9') digit = c - '0';
+    else if (c >= 'a' && c <= 'f') digit = c - 'a' + 10;
+    else if (c >= 'A' && c <= 'F') digit = c - 'A' + 10;
+    else return false;
+    result = (uint16_t)((result << 4) | digit);
+  }
+  *value = result;
+  return true;
+}
+
+// Copia o próximo trecho entre aspas para dest e devolve o ponteiro após a
+// aspa de fechamento, ou NULL se não houver um par completo.
+static const char *copyQuoted(const char *p, char *dest, size_t size) {
+  const char *open = strchr(p, '"');
+  if (open == NULL) return NULL;
+  const char *close = strchr(open + 1, '"');
+  if (close == NULL) return NULL;
+
+  size_t length = (size_t)(close - open - 1);
+  if (length > size - 1) length = size - 1;
+  memcpy(dest, open + 1, length);
+  dest[length] = '\0';
+  return close + 1;
+}
+
+SpoofParseResult parseSpoofArgs(const char *line, SpoofArgs *args) {
+  args->product[0] = '\0';
+  args->manufacturer[0] = '\0';
+
+  const char *p = tokenEnd(line);
+  if (*p == '\0') return SPOOF_PARSE_INVALID_FORMAT;
+
+  const char *vidStart = skipSpaces(p);
+  const char *vidEnd = tokenEnd(vidStart);
+  if (vidStart == vidEnd || *vidEnd == '\0') return SPOOF_PARSE_INVALID_FORMAT;
+
+  const char *pidStart = skipSpaces(vidEnd);
+  const char *pidEnd = tokenEnd(pidStart);
+  if (pidStart == pidEnd || *pidEnd == '\0') return SPOOF_PARSE_INVALID_FORMAT;
+
+  const char *remaining = skipSpaces(pidEnd);
+  if (*remaining == '\0') return SPOOF_PARSE_INVALID_FORMAT;
+
+  if (!parseHex16(vidStart, vidEnd, &args->vid)) return SPOOF_PARSE_INVALID_VID;
+  if (!parseHex16(pidStart, pidEnd, &args->pid)) return SPOOF_PARSE_INVALID_PID;
+
+  const char *next = copyQuoted(remaining, args->product, sizeof(args->product));
+  if (next != NULL) {
+    copyQuoted(next, args->manufacturer, sizeof(args->manufacturer));
+  }
+  return SPOOF_PARSE_OK;
+}
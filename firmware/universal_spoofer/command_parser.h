@@ -0,0 +1,61 @@
+#ifndef COMMAND_PARSER_H
+#define COMMAND_PARSER_H
+
+#include <stdint.h>
+#include <stddef.h>
+
+// Sem dependências do core Arduino: este módulo também é compilado nativamente
+// em firmware/host para medir latência do parser.
+
+#define LINE_BUFFER_SIZE 96
+#define SPOOF_STRING_SIZE 32
+
+enum LineStatus {
+  LINE_PENDING,
+  LINE_READY,
+  LINE_OVERFLOW
+};
+
+struct LineAssembler {
+  char buffer[LINE_BUFFER_SIZE];
+  uint8_t length;
+  bool overflow;
+};
+
+enum CommandType {
+  CMD_NONE,
+  CMD_STATUS,
+  CMD_SPOOF,
+  CMD_RESET,
+  CMD_SAVE,
+  CMD_TEST_MOUSE,
+  CMD_UNKNOWN
+};
+
+enum SpoofParseResult {
+  SPOOF_PARSE_OK,
+  SPOOF_PARSE_INVALID_FORMAT,
+  SPOOF_PARSE_INVALID_VID,
+  SPOOF_PARSE_INVALID_PID
+};
+
+struct SpoofArgs {
+  uint16_t vid;
+  uint16_t pid;
+  char product[SPOOF_STRING_SIZE];
+  char manufacturer[SPOOF_STRING_SIZE];
+};
+
+void lineAssemblerReset(LineAssembler *assembler);
+
+// Consome um byte. Ao retornar LINE_READY, assembler->buffer contém a linha
+// já sem espaços nas pontas e terminada em '\0'; chame lineAssemblerReset
+// depois de tratá-la. LINE_OVERFLOW indica uma linha descartada por exceder
+// o buffer.
+LineStatus lineAssemblerFeed(LineAssembler *assembler, char c);
+
+CommandType parseCommand(const char *line);
+
+SpoofParseResult parseSpoofArgs(const char *line, SpoofArgs *args);
+
+#endif
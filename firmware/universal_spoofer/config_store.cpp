@@ -0,0 +1,86 @@
+#include "config_store.h"
+
+#include <EEPROM.h>
+#include <string.h>
+
+// Layout da versão 1: Config sem cabeçalho seguido do byte 'configured'.
+#define LEGACY_CONFIGURED_OFFSET 68
+
+static void readBytes(int address, void *dest, uint16_t size) {
+  uint8_t *bytes = (uint8_t *)dest;
+  for (uint16_t i = 0; i < size; i++) {
+    bytes[i] = EEPROM.read(address + i);
+  }
+}
+
+static uint16_t updateBytes(int address, const void *src, uint16_t size) {
+  const uint8_t *bytes = (const uint8_t *)src;
+  uint16_t written = 0;
+  for (uint16_t i = 0; i < size; i++) {
+    if (EEPROM.read(address + i) != bytes[i]) {
+      EEPROM.update(address + i, bytes[i]);
+      written++;
+    }
+  }
+  return written;
+}
+
+static void terminateStrings(Config *config) {
+  config->product_name[sizeof(config->product_name) - 1] = '\0';
+  config->manufacturer[sizeof(config->manufacturer) - 1] = '\0';
+}
+
+uint16_t configCrc(const Config *config) {
+  const uint8_t *bytes = (const uint8_t *)config;
+  uint16_t crc = 0xFFFF;
+  for (uint16_t i = 0; i < sizeof(Config); i++) {
+    crc ^= (uint16_t)bytes[i] << 8;
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (uint16_t)((crc << 1) ^ 0x1021) : (uint16_t)(crc << 1);
+    }
+  }
+  return crc;
+}
+
+ConfigLoadResult configLoad(Config *config) {
+  ConfigHeader header;
+  readBytes(CONFIG_ADDRESS, &header, sizeof(header));
+
+  if (header.magic == CONFIG_MAGIC) {
+    if (header.version != CONFIG_VERSION || header.length != sizeof(Config)) {
+      return CONFIG_EMPTY;
+    }
+    Config stored;
+    readBytes(CONFIG_ADDRESS + sizeof(header), &stored, sizeof(stored));
+    if (configCrc(&stored) != header.crc) {
+      return CONFIG_EMPTY;
+    }
+    terminateStrings(&stored);
+    *config = stored;
+    return CONFIG_LOADED;
+  }
+
+  if (EEPROM.read(CONFIG_ADDRESS + LEGACY_CONFIGURED_OFFSET) == 1) {
+    Config legacy;
+    readBytes(CONFIG_ADDRESS, &legacy, sizeof(legacy));
+    terminateStrings(&legacy);
+    *config = legacy;
+    return CONFIG_MIGRATED;
+  }
+
+  return CONFIG_EMPTY;
+}
+
+uint16_t configSave(const Config *config) {
+  ConfigHeader header;
+  header.magic = CONFIG_MAGIC;
+  header.version = CONFIG_VERSION;
+  header.length = sizeof(Config);
+  header.crc = configCrc(config);
+
+  // Dados antes do cabeçalho: uma queda de energia no meio deixa o CRC
+  // inconsistente e a próxima carga volta ao padrão em vez de usar lixo.
+  uint16_t written = updateBytes(CONFIG_ADDRESS + sizeof(header), config, sizeof(Config));
+  written += updateBytes(CONFIG_ADDRESS, &header, sizeof(header));
+  return written;
+}
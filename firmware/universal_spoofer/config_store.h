@@ -0,0 +1,44 @@
+#ifndef CONFIG_STORE_H
+#define CONFIG_STORE_H
+
+#include <stdint.h>
+
+// Layout na EEPROM (endereço 0):
+//   ConfigHeader | Config
+// O CRC cobre apenas o Config. A gravação só toca bytes que mudaram, então
+// salvar a mesma configuração não consome ciclos de escrita.
+
+#define CONFIG_MAGIC 0x5350
+#define CONFIG_VERSION 2
+#define CONFIG_ADDRESS 0
+
+struct Config {
+  uint16_t vid;
+  uint16_t pid;
+  char product_name[32];
+  char manufacturer[32];
+};
+
+struct ConfigHeader {
+  uint16_t magic;
+  uint8_t version;
+  uint8_t length;
+  uint16_t crc;
+};
+
+enum ConfigLoadResult {
+  CONFIG_LOADED,
+  CONFIG_MIGRATED,
+  CONFIG_EMPTY
+};
+
+uint16_t configCrc(const Config *config);
+
+// CONFIG_MIGRATED: lido do layout antigo (struct crua com flag 'configured'),
+// ainda não regravado. CONFIG_EMPTY: nada válido, config não foi alterado.
+ConfigLoadResult configLoad(Config *config);
+
+// Devolve quantos bytes foram efetivamente gravados (0 = nada mudou).
+uint16_t configSave(const Config *config);
+
+#endif
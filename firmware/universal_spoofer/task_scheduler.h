@@ -0,0 +1,43 @@
+#ifndef TASK_SCHEDULER_H
+#define TASK_SCHEDULER_H
+
+#include <stdint.h>
+
+// Escalonador cooperativo: cada tarefa roda até o fim sem bloquear e informa
+// em quantos ms quer ser chamada de novo. Nenhuma tarefa pode usar delay().
+
+typedef unsigned long (*TaskFunction)(unsigned long now);
+
+struct Task {
+  TaskFunction run;
+  unsigned long nextRun;
+  bool enabled;
+};
+
+#define TASK_DONE 0UL
+
+inline void taskStart(Task *task, unsigned long now, unsigned long delayMs) {
+  task->nextRun = now + delayMs;
+  task->enabled = true;
+}
+
+inline void taskStop(Task *task) {
+  task->enabled = false;
+}
+
+// Retornar TASK_DONE desativa a tarefa; qualquer outro valor reagenda.
+inline void schedulerRun(Task *tasks, uint8_t count, unsigned long now) {
+  for (uint8_t i = 0; i < count; i++) {
+    Task *task = &tasks[i];
+    if (!task->enabled || (long)(now - task->nextRun) < 0) continue;
+
+    unsigned long next = task->run(now);
+    if (next == TASK_DONE) {
+      task->enabled = false;
+    } else {
+      task->nextRun = now + next;
+    }
+  }
+}
+
+#endif
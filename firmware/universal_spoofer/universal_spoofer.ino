@@ -1,16 +1,17 @@
-#include <EEPROM.h>
 #include <Mouse.h>
+#include <avr/wdt.h>
 
-struct Config {
-  uint16_t vid;
-  uint16_t pid;
-  char product_name[32];
-  char manufacturer[32];
-  bool configured;
-};
+#include "command_parser.h"
+#include "config_store.h"
+#include "task_scheduler.h"
 
 Config config;
 
+#define SERIAL_BYTES_PER_LOOP 64
+#define IDLE_MOVE_INTERVAL_MS 5000UL
+
+LineAssembler lineAssembler;
+
 #ifndef USB_VID
 #define USB_VID 0x2341
 #endif
@@ -28,66 +29,93 @@ Config config;
 #endif
 
 void setup() {
+  MCUSR = 0;
+  wdt_disable();
+
   Serial.begin(115200);
   while (!Serial) { delay(10); }
 
-  EEPROM.get(0, config);
-
-  if (!config.configured) {
-    config.vid = USB_VID;
-    config.pid = USB_PID;
-    strncpy(config.product_name, USB_PRODUCT, sizeof(config.product_name));
-    strncpy(config.manufacturer, USB_MANUFACTURER, sizeof(config.manufacturer));
-    config.configured = true;
-    EEPROM.put(0, config);
+  ConfigLoadResult loaded = configLoad(&config);
+  if (loaded == CONFIG_EMPTY) {
+    loadDefaults();
+  }
+  if (loaded != CONFIG_LOADED) {
+    configSave(&config);
   }
 
   Mouse.begin();
+  lineAssemblerReset(&lineAssembler);
 
   Serial.println("UNIVERSAL_SPOOFER_READY");
   printStatus();
 }
 
+unsigned long idleMoveTask(unsigned long now);
+unsigned long testMouseTask(unsigned long now);
+
+Task tasks[] = {
+  { idleMoveTask, IDLE_MOVE_INTERVAL_MS, true },
+  { testMouseTask, 0, false }
+};
+
+#define TASK_COUNT (sizeof(tasks) / sizeof(tasks[0]))
+#define TASK_TEST_MOUSE (&tasks[1])
+
 void loop() {
-  if (Serial.available()) {
-    String command = Serial.readStringUntil('\n');
-    command.trim();
+  pollSerial();
+  schedulerRun(tasks, TASK_COUNT, millis());
+}
 
-    if (command == "STATUS") {
-      printStatus();
+void pollSerial() {
+  uint8_t budget = SERIAL_BYTES_PER_LOOP;
+  while (budget-- > 0 && Serial.available() > 0) {
+    LineStatus status = lineAssemblerFeed(&lineAssembler, (char)Serial.read());
+    if (status == LINE_READY) {
+      handleCommand(lineAssembler.buffer);
+      lineAssemblerReset(&lineAssembler);
     }
-    else if (command.startsWith("SPOOF")) {
-      handleSpoofCommand(command);
+    else if (status == LINE_OVERFLOW) {
+      Serial.println("ERROR:LINE_TOO_LONG");
     }
-    else if (command == "RESET") {
-      resetToDefault();
-    }
-    else if (command == "SAVE") {
-      EEPROM.put(0, config);
-      Serial.println("CONFIG_SAVED");
+  }
+}
+
+void handleCommand(const char *line) {
+  switch (parseCommand(line)) {
+    case CMD_STATUS:
       printStatus();
-      Serial.println("Reiniciando para aplicar configuração...");
-      delay(1000);
-      setup();
-    }
-    else if (command == "TEST_MOUSE") {
-      testMouseFunctions();
-    }
-    else {
+      break;
+    case CMD_SPOOF:
+      handleSpoofCommand(line);
+      break;
+    case CMD_RESET:
+      resetToDefault();
+      break;
+    case CMD_SAVE:
+      saveAndRestart();
+      break;
+    case CMD_TEST_MOUSE:
+      startTestMouse();
+      break;
+    case CMD_NONE:
+      break;
+    default:
       Serial.println("ERROR:UNKNOWN_COMMAND");
       Serial.println("Comandos disponíveis: STATUS, SPOOF, RESET, SAVE, TEST_MOUSE");
-    }
+      break;
   }
+}
 
-  static unsigned long lastMove = 0;
-  if (millis() - lastMove > 5000) {
+unsigned long idleMoveTask(unsigned long now) {
+  static bool returning = false;
+  if (!returning) {
     Mouse.move(1, 0, 0);
-    delay(10);
-    Mouse.move(-1, 0, 0);
-    lastMove = millis();
+    returning = true;
+    return 10;
   }
-
-  delay(50);
+  Mouse.move(-1, 0, 0);
+  returning = false;
+  return IDLE_MOVE_INTERVAL_MS;
 }
 
 void printStatus() {
@@ -102,89 +130,104 @@ void printStatus() {
   Serial.println("HID_ACTIVE:YES");
 }
 
-void handleSpoofCommand(String command) {
-
-  int firstSpace = command.indexOf(' ');
-  if (firstSpace <= 0) {
-    Serial.println("ERROR:INVALID_SPOOF_FORMAT");
-    return;
+void handleSpoofCommand(const char *line) {
+  SpoofArgs args;
+  switch (parseSpoofArgs(line, &args)) {
+    case SPOOF_PARSE_INVALID_FORMAT:
+      Serial.println("ERROR:INVALID_SPOOF_FORMAT");
+      return;
+    case SPOOF_PARSE_INVALID_VID:
+      Serial.println("ERROR:INVALID_VID");
+      return;
+    case SPOOF_PARSE_INVALID_PID:
+      Serial.println("ERROR:INVALID_PID");
+      return;
+    default:
+      break;
   }
 
-  String args = command.substring(firstSpace + 1);
-  args.trim();
-  int secondSpace = args.indexOf(' ');
-  if (secondSpace <= 0) {
-    Serial.println("ERROR:INVALID_SPOOF_FORMAT");
-    return;
-  }
-
-  String vidStr = args.substring(0, secondSpace);
-  String rest = args.substring(secondSpace + 1);
-  rest.trim();
-
-  int thirdSpace = rest.indexOf(' ');
-  if (thirdSpace <= 0) {
-    Serial.println("ERROR:INVALID_SPOOF_FORMAT");
-    return;
-  }
-
-  String pidStr = rest.substring(0, thirdSpace);
-  String remaining = rest.substring(thirdSpace + 1);
-  remaining.trim();
-
-  String product, manufacturer;
-  int firstQuote = remaining.indexOf('"');
-  if (firstQuote >= 0) {
-    int secondQuote = remaining.indexOf('"', firstQuote + 1);
-    if (secondQuote > firstQuote) {
-      product = remaining.substring(firstQuote + 1, secondQuote);
-      int nextQuote = remaining.indexOf('"', secondQuote + 1);
-      if (nextQuote >= 0) {
-        int lastQuote = remaining.indexOf('"', nextQuote + 1);
-        if (lastQuote > nextQuote) {
-          manufacturer = remaining.substring(nextQuote + 1, lastQuote);
-        }
-      }
-    }
-  }
-
-  if (vidStr.startsWith("0x") || vidStr.startsWith("0X")) vidStr = vidStr.substring(2);
-  if (pidStr.startsWith("0x") || pidStr.startsWith("0X")) pidStr = pidStr.substring(2);
-
-  char *endptr;
-  unsigned long vidLong = strtoul(vidStr.c_str(), &endptr, 16);
-  if (*endptr != '\0') { Serial.println("ERROR:INVALID_VID"); return; }
-  unsigned long pidLong = strtoul(pidStr.c_str(), &endptr, 16);
-  if (*endptr != '\0') { Serial.println("ERROR:INVALID_PID"); return; }
-
-  config.vid = (uint16_t)vidLong;
-  config.pid = (uint16_t)pidLong;
-  product.toCharArray(config.product_name, sizeof(config.product_name));
-  manufacturer.toCharArray(config.manufacturer, sizeof(config.manufacturer));
+  config.vid = args.vid;
+  config.pid = args.pid;
+  strncpy(config.product_name, args.product, sizeof(config.product_name));
+  strncpy(config.manufacturer, args.manufacturer, sizeof(config.manufacturer));
 
   Serial.println("SPOOF_SUCCESS");
   printStatus();
   Serial.println("Execute SAVE para persistir e reiniciar");
 }
 
-void resetToDefault() {
+void loadDefaults() {
+  memset(&config, 0, sizeof(config));
   config.vid = USB_VID;
   config.pid = USB_PID;
-  strncpy(config.product_name, USB_PRODUCT, sizeof(config.product_name));
-  strncpy(config.manufacturer, USB_MANUFACTURER, sizeof(config.manufacturer));
-  config.configured = true;
-  EEPROM.put(0, config);
+  strncpy(config.product_name, USB_PRODUCT, sizeof(config.product_name) - 1);
+  strncpy(config.manufacturer, USB_MANUFACTURER, sizeof(config.manufacturer) - 1);
+}
+
+void saveAndRestart() {
+  uint16_t written = configSave(&config);
+  Serial.print("CONFIG_SAVED:BYTES=");
+  Serial.println(written);
+  printStatus();
+  Serial.println("Reiniciando para aplicar configuração...");
+  softwareReset();
+}
+
+// Reset pelo watchdog: reinicia o MCU do zero (pilha, USB e periféricos),
+// em vez de chamar setup() de dentro do loop.
+void softwareReset() {
+  Serial.flush();
+  delay(100);
+  wdt_enable(WDTO_15MS);
+  for (;;) {}
+}
+
+void resetToDefault() {
+  loadDefaults();
+  configSave(&config);
 
   Serial.println("RESET_SUCCESS");
   printStatus();
 }
 
-void testMouseFunctions() {
+struct MouseTestStep {
+  int8_t dx;
+  uint8_t button;
+  unsigned int waitMs;
+};
+
+const MouseTestStep mouseTestSteps[] = {
+  { 10, 0, 500 },
+  { -10, 0, 500 },
+  { 0, MOUSE_LEFT, 300 },
+  { 0, MOUSE_RIGHT, 300 },
+  { 0, MOUSE_MIDDLE, 300 }
+};
+
+#define MOUSE_TEST_STEP_COUNT (sizeof(mouseTestSteps) / sizeof(mouseTestSteps[0]))
+
+uint8_t mouseTestStep = 0;
+
+void startTestMouse() {
+  if (TASK_TEST_MOUSE->enabled) {
+    Serial.println("ERROR:TEST_MOUSE_RUNNING");
+    return;
+  }
   Serial.println("TEST_MOUSE:Movimento e cliques...");
-  Mouse.move(10, 0, 0); delay(500);
-  Mouse.move(-10, 0, 0); delay(500);
-  Mouse.click(MOUSE_LEFT); delay(300);
-  Mouse.click(MOUSE_RIGHT); delay(300);
-  Mouse.click(MOUSE_MIDDLE); delay(300);
-  Serial.println("TEST_MOUSE:Concluído");
-}
\ No newline at end of file
+  mouseTestStep = 0;
+  taskStart(TASK_TEST_MOUSE, millis(), 0);
+}
+
+unsigned long testMouseTask(unsigned long now) {
+  if (mouseTestStep >= MOUSE_TEST_STEP_COUNT) {
+    Serial.println("TEST_MOUSE:Concluído");
+    return TASK_DONE;
+  }
+  const MouseTestStep &step = mouseTestSteps[mouseTestStep++];
+  if (step.button) {
+    Mouse.click(step.button);
+  } else {
+    Mouse.move(step.dx, 0, 0);
+  }
+  return step.waitMs;
+}
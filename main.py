@@ -1,7 +1,5 @@
 import sys
-import os
-import json
-import time
+import threading
 from datetime import datetime
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QGroupBox, QLabel, QComboBox,
@@ -10,10 +8,19 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QAction, QGridLayout, QCheckBox, QMenuBar,
                              QDesktopWidget)
 from PyQt5.QtGui import QFont
-from PyQt5.QtCore import Qt, QPoint
+from PyQt5.QtCore import Qt, QPoint, QTimer, pyqtSignal
 from utils.file_manager import FileManager
 from utils.arduino_utils import ArduinoUtils
 from utils.spoof_engine import SpoofEngine
+from utils.boards_baseline import BoardsBaseline
+from utils.settings_store import SettingsStore
+from utils.scheduler import OperationScheduler, port_resource, boards_resource, build_resource
+from utils.prebuild import Prebuilder
+from utils.toolchain import toolchain
+from utils.latency_model import latency
+from utils.pipeline import Pipeline, PipelineAbort, Stage
+from utils.run_history import RunHistory, format_report, format_size, format_size_delta
+from utils.device_registry import DeviceRegistry, port_identity
 
 class TitleBar(QWidget):
     def __init__(self, parent):
@@ -53,33 +60,32 @@ class TitleBar(QWidget):
             event.accept()
 
 class ArduinoSpooferApp(QMainWindow):
+    ui_call = pyqtSignal(object)
+
     def __init__(self):
         super().__init__()
+        self.ui_call.connect(lambda fn: fn())
         self.dragPosition = QPoint()
         self.worker = None
         self.file_manager = FileManager()
         self.arduino_utils = ArduinoUtils()
         self.spoof_engine = SpoofEngine()
 
-        self.config = {
-            'arduino_path': '',
-            'selected_port': '',
-            'selected_brand': '',
-            'selected_model': '',
-            'upload_sketch': True,
-            'firmware_mode': 'universal',
-            'mouse_profiles': self.spoof_engine.load_profiles(),
-            'force_vid_pid': False,
-            'force_product_manufacturer': False
-        }
+        self.settings = SettingsStore()
+        self.scheduler = OperationScheduler()
+        self.prebuilder = Prebuilder(self.scheduler, on_event=self.log_async)
+        self.registry = DeviceRegistry()
+        self.history = RunHistory()
+        self.applied_profile = None
 
-        self.mouse_profiles = self.config['mouse_profiles']
+        self.mouse_profiles = self.spoof_engine.profiles
         if not self.mouse_profiles:
             self.mouse_profiles = {"Exemplo": {"Modelo1": {"vid": "0x1234", "pid": "0x5678"}}}
 
         self.init_ui()
-        self.load_settings()
         self.center_window()
+        self.spoof_engine.watch_profiles(self.on_profiles_file_changed)
+        QTimer.singleShot(0, self.load_settings)
 
     def init_ui(self):
         self.setWindowTitle("Arduino Mouse Spoofer")
@@ -110,6 +116,12 @@ class ArduinoSpooferApp(QMainWindow):
         tabs.addTab(config_tab, "Configurações")
         self.setup_config_tab(config_tab)
 
+        self.history_tab = QWidget()
+        tabs.addTab(self.history_tab, "Histórico")
+        self.setup_history_tab(self.history_tab)
+        tabs.currentChanged.connect(
+            lambda index: self.refresh_history() if tabs.widget(index) is self.history_tab else None)
+
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
         self.status_bar.showMessage("Pronto")
@@ -274,27 +286,62 @@ class ArduinoSpooferApp(QMainWindow):
         self.verify_spoof_btn = QPushButton("Procurar rastro do Arduino")
         self.verify_spoof_btn.clicked.connect(self.verify_spoof_status)
         verify_layout.addWidget(self.verify_spoof_btn)
+        self.trace_status_label = QLabel("boards.txt: não verificado")
+        verify_layout.addWidget(self.trace_status_label)
+
+        port_check_group = QGroupBox("Verificação de Porta")
+        port_check_layout = QVBoxLayout(port_check_group)
+        self.chk_verify_bootloader = QCheckBox("Detectar bootloader (toque 1200bps)")
+        self.chk_verify_flash = QCheckBox("Gravar blink_test como último recurso")
+        self.chk_force_full_apply = QCheckBox("Sempre regravar firmware")
+        port_check_layout.addWidget(self.chk_verify_bootloader)
+        port_check_layout.addWidget(self.chk_verify_flash)
+        port_check_layout.addWidget(self.chk_force_full_apply)
 
         layout.addWidget(fw_group, 0, 0)
         layout.addWidget(flags_group, 0, 1)
         layout.addWidget(arduino_group, 1, 0)
         layout.addWidget(verify_group, 1, 1)
+        layout.addWidget(port_check_group, 2, 0)
+
+    def setup_history_tab(self, tab):
+        layout = QVBoxLayout(tab)
+
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("Operação:"))
+        self.history_kind_combo = QComboBox()
+        self.history_kind_combo.addItems(["todas", "spoof", "verify", "status", "spoof-test"])
+        filter_layout.addWidget(self.history_kind_combo)
+        filter_layout.addWidget(QLabel("Agrupar por:"))
+        self.history_by_combo = QComboBox()
+        self.history_by_combo.addItems(["-", "station", "location", "core_version", "cli_version", "profile", "outcome"])
+        filter_layout.addWidget(self.history_by_combo)
+        refresh_btn = QPushButton("Atualizar")
+        refresh_btn.clicked.connect(self.refresh_history)
+        filter_layout.addWidget(refresh_btn)
+        filter_layout.addStretch()
+        layout.addLayout(filter_layout)
+
+        self.history_text = QTextEdit()
+        self.history_text.setReadOnly(True)
+        self.history_text.setFont(QFont("Consolas", 9))
+        layout.addWidget(self.history_text)
+
+        self.history_kind_combo.currentTextChanged.connect(lambda _: self.refresh_history())
+        self.history_by_combo.currentTextChanged.connect(lambda _: self.refresh_history())
+
+    def refresh_history(self):
+        kind = self.history_kind_combo.currentText()
+        by = self.history_by_combo.currentText()
+        try:
+            report = format_report(self.history, None if kind == "todas" else kind, days=30,
+                                   by=None if by == "-" else by)
+        except Exception as e:
+            report = f"Erro ao ler histórico: {e}"
+        self.history_text.setPlainText(report)
 
     def find_default_arduino_path(self):
-        base_path = os.path.join(
-            os.path.expanduser("~"),
-            "AppData", "Local", "Arduino15", "packages", "arduino", "hardware", "avr"
-        )
-        if os.path.exists(base_path):
-            versions = os.listdir(base_path)
-            versions = [v for v in versions if os.path.isdir(os.path.join(base_path, v))]
-            if versions:
-                versions.sort(reverse=True)
-                default_path = os.path.join(base_path, versions[0])
-                boards_file = os.path.join(default_path, "boards.txt")
-                if os.path.exists(boards_file):
-                    return default_path
-        return None
+        return toolchain.avr_core_path()
 
     def refresh_ports(self):
         self.port_combo.clear()
@@ -305,6 +352,11 @@ class ArduinoSpooferApp(QMainWindow):
         if ports:
             for p in ports:
                 label = f"{p['device']} ({p['description']})"
+                vendor_name, product_name = p['usb_names']
+                if vendor_name:
+                    label += f" - {vendor_name}"
+                    if product_name:
+                        label += f" {product_name}"
                 self.port_combo.addItem(label, p['device'])
             self.log_message(f"{len(ports)} porta(s) encontrada(s)")
         else:
@@ -319,17 +371,58 @@ class ArduinoSpooferApp(QMainWindow):
         self.port_status_label.setText("Status: Verificando...")
         self.port_status_label.setStyleSheet("color: #ffeb3b; font-weight: bold;")
 
-        ok, out, err = self.arduino_utils.upload_sketch(
-            port, self.path_edit_spoofer.text(), mode="blink"
+        arduino_path = self.path_edit_spoofer.text()
+        bootloader_touch = self.chk_verify_bootloader.isChecked()
+        flash_fallback = self.chk_verify_flash.isChecked()
+        known_ids = self.known_device_ids()
+        if flash_fallback:
+            resources = self.upload_resources(port, arduino_path, "blink")
+        else:
+            resources = [port_resource(port)]
+
+        op = self.history.begin("verify", port, arduino_path=arduino_path)
+        self.run_operation(
+            f"verify {port}",
+            lambda: self.verify_port_job(op, port, known_ids, bootloader_touch, flash_fallback, arduino_path),
+            resources,
+            lambda result: self.on_port_verified(port, *result),
+            op=op
+        )
+
+    def verify_port_job(self, op, port, known_ids, bootloader_touch, flash_fallback, arduino_path):
+        ok, tier, msg, firmware = self.arduino_utils.verify_port(
+            port, known_ids,
+            bootloader_touch=bootloader_touch,
+            flash_fallback=flash_fallback,
+            arduino_path=arduino_path
         )
+        port_info = self.arduino_utils.find_port_info(port)
+        if ok and port_info:
+            self.registry.record(port_info, firmware=firmware)
+        if port_info:
+            op.location = port_info.location
+        op.outcome = tier
+        return ok, tier, msg
+
+    def known_device_ids(self):
+        ids = set()
+        try:
+            baseline = BoardsBaseline.load(self.file_manager.default_template_file)
+            ids |= baseline.usb_ids("leonardo")
+        except Exception as e:
+            self.log_message(f" Erro ao ler IDs de fábrica: {e}")
+        ids |= set(self.spoof_engine.profiles_by_usb_id)
+        return ids
+
+    def on_port_verified(self, port, ok, tier, msg):
         if ok:
             self.port_status_label.setText("Status:  Sucesso")
             self.port_status_label.setStyleSheet("color: #4caf50; font-weight: bold;")
-            self.log_message(f"{port}   Verificado com Sucesso !!!")
+            self.log_message(f"{port}   Verificado com Sucesso !!! [{tier}] {msg}")
         else:
             self.port_status_label.setText("Status:  Falha")
             self.port_status_label.setStyleSheet("color: #f44336; font-weight: bold;")
-            self.log_message(f"Falha ao enviar blink_test.ino: {err or out}")
+            self.log_message(f"Falha na verificação de {port}: {msg}")
 
     def update_models(self):
         self.model_combo.clear()
@@ -337,11 +430,87 @@ class ArduinoSpooferApp(QMainWindow):
         if brand in self.mouse_profiles:
             self.model_combo.addItems(self.mouse_profiles[brand].keys())
 
+    def on_profiles_file_changed(self, ok, msg, data):
+        def _apply():
+            if not ok:
+                self.log_message(f" {msg}")
+                return
+            diff = self.spoof_engine.apply_profiles(data)
+            self.apply_profiles_diff(diff)
+        self.ui_call.emit(_apply)
+
+    def apply_profiles_diff(self, diff):
+        total = len(diff["added"]) + len(diff["removed"]) + len(diff["changed"])
+        if not total:
+            return
+        if self.spoof_engine.profiles:
+            self.mouse_profiles = self.spoof_engine.profiles
+
+        brand = self.brand_combo.currentText()
+        model = self.model_combo.currentText()
+
+        self.brand_combo.blockSignals(True)
+        self.model_combo.blockSignals(True)
+        try:
+            self._sync_combo(self.brand_combo, list(self.mouse_profiles))
+            self._sync_combo(self.model_combo, list(self.mouse_profiles.get(self.brand_combo.currentText(), {})))
+        finally:
+            self.brand_combo.blockSignals(False)
+            self.model_combo.blockSignals(False)
+
+        new_brand = self.brand_combo.currentText()
+        new_model = self.model_combo.currentText()
+        if (new_brand, new_model) != (brand, model):
+            self.settings.update({'selected_brand': new_brand, 'selected_model': new_model})
+            self.log_message(f" Perfil selecionado removido, usando {new_brand} {new_model}")
+        if (new_brand, new_model) != (brand, model) or (brand, model) in diff["changed"]:
+            self.schedule_prebuild()
+
+        self.log_message(
+            f" profiles.json recarregado: +{len(diff['added'])} "
+            f"-{len(diff['removed'])} ~{len(diff['changed'])}"
+        )
+
+    def _sync_combo(self, combo, items):
+        current = combo.currentText()
+        wanted = set(items)
+        for i in reversed(range(combo.count())):
+            if combo.itemText(i) not in wanted:
+                combo.removeItem(i)
+        for index, item in enumerate(items):
+            if combo.itemText(index) != item:
+                existing = combo.findText(item)
+                if existing >= 0:
+                    combo.removeItem(existing)
+                combo.insertItem(index, item)
+        if current in wanted:
+            combo.setCurrentText(current)
+
     def browse_arduino_path(self):
         path = QFileDialog.getExistingDirectory(self, "Selecionar Pasta do Arduino")
         if path:
             self.path_edit_spoofer.setText(path)
             self.path_edit_config.setText(path)
+            self.watch_boards_file(path)
+
+    def watch_boards_file(self, arduino_path):
+        if not arduino_path:
+            return
+        boards_path = self.file_manager.watch_boards_file(arduino_path, self.on_boards_file_changed)
+        if boards_path:
+            traced, msg = self.file_manager.check_spoof_trace(arduino_path)
+            self.show_trace_verdict(traced, msg)
+
+    def on_boards_file_changed(self, boards_path, traced, msg):
+        def _update():
+            self.show_trace_verdict(traced, msg)
+            self.log_message(f" boards.txt alterado ({boards_path}):{msg}")
+        self.ui_call.emit(_update)
+
+    def show_trace_verdict(self, traced, msg):
+        self.trace_status_label.setText(f"boards.txt:{msg}")
+        color = "#ff5252" if traced else "#4caf50"
+        self.trace_status_label.setStyleSheet(f"color: {color}; font-weight: bold;")
 
     def verify_spoof_status(self):
         arduino_path = self.path_edit_config.text().strip()
@@ -349,7 +518,7 @@ class ArduinoSpooferApp(QMainWindow):
             self.log_message(" Caminho do Arduino não definido.")
             return
 
-        profile = self.config.get("mouse_profile")
+        profile = self.applied_profile
         if not profile:
             brand = self.brand_combo.currentText()
             model = self.model_combo.currentText()
@@ -380,60 +549,298 @@ class ArduinoSpooferApp(QMainWindow):
             return
 
         port = self.port_combo.currentData()
-        vid = mouse_profile["vid"]
-        pid = mouse_profile["pid"]
-        product = mouse_profile.get("product", f"{brand} {model}")
-
         force_vid_pid = self.chk_force_vid_pid.isChecked()
         force_product_manufacturer = self.chk_force_product_manufacturer.isChecked()
 
-        self.config.update({
+        self.applied_profile = mouse_profile
+        self.settings.update({
             'selected_port': port,
             'selected_brand': brand,
             'selected_model': model,
             'arduino_path': self.path_edit_spoofer.text(),
-            'mouse_profile': mouse_profile,
             'firmware_mode': self.fw_combo.currentText(),
             'force_vid_pid': force_vid_pid,
             'force_product_manufacturer': force_product_manufacturer
         })
 
         arduino_path = self.path_edit_spoofer.text().strip()
-        backup = self.file_manager.backup_boards_file(arduino_path)
-        if backup:
-            self.log_message(f"Backup criado: {backup}")
-        else:
-            self.log_message(" Não foi possível criar backup do boards.txt")
-
-        ok = self.file_manager.modify_boards_file(
-            arduino_path,
-            {
-                "vid": vid,
-                "pid": pid,
-                "product": product,
-                "usb_product": mouse_profile.get("usb_product", product),
-                "usb_manufacturer": mouse_profile.get("usb_manufacturer", brand),
-                "force_vid_pid": force_vid_pid,
-                "force_product_manufacturer": force_product_manufacturer
-            }
+        board_profile = self.build_board_profile(brand, model, mouse_profile)
+        self.prebuilder.settle(self.file_manager.build_extra_flags(board_profile))
+
+        self.spoof_btn.setEnabled(False)
+        self.progress_bar.setValue(0)
+        force_full = self.chk_force_full_apply.isChecked()
+        label = f"{brand} {model}"
+        op = self.history.begin("spoof", port, profile=label, arduino_path=arduino_path)
+        self.run_operation(
+            f"spoof {port}",
+            lambda: self.apply_spoof(port, arduino_path, board_profile, label, force_full, op),
+            self.upload_resources(port, arduino_path, "universal"),
+            self.on_spoof_finished,
+            on_error=lambda: self.spoof_btn.setEnabled(True),
+            op=op
         )
-        if not ok:
-            self.log_message(" Falha ao modificar boards.txt")
-            return
-        self.log_message(f"boards.txt modificado para {brand} {model} ({vid}:{pid})")
 
-        self.log_message(" Enviando firmware universal...")
-        time.sleep(3)
-        ok, out, err = self.arduino_utils.upload_sketch(
-            port, arduino_path, mode="universal"
-        )
+    def build_board_profile(self, brand, model, mouse_profile):
+        product = mouse_profile.get("product", f"{brand} {model}")
+        return {
+            "vid": mouse_profile["vid"],
+            "pid": mouse_profile["pid"],
+            "product": product,
+            "usb_product": mouse_profile.get("usb_product", product),
+            "usb_manufacturer": mouse_profile.get("usb_manufacturer", brand),
+            "force_vid_pid": self.chk_force_vid_pid.isChecked(),
+            "force_product_manufacturer": self.chk_force_product_manufacturer.isChecked()
+        }
 
-        if not ok:
-            self.log_message(f" Falha ao enviar universal_spoofer.ino: {err or out}")
+    def schedule_prebuild(self):
+        brand = self.brand_combo.currentText()
+        model = self.model_combo.currentText()
+        mouse_profile = self.spoof_engine.get_profile(brand, model)
+        arduino_path = self.path_edit_spoofer.text().strip()
+        if not mouse_profile or not arduino_path:
             return
+        if not self.arduino_utils.get_cli_path():
+            return
+
+        board_profile = self.build_board_profile(brand, model, mouse_profile)
+        boards_path = self.file_manager._find_boards_file(arduino_path)
+        resources = [boards_resource(boards_path)] if boards_path else []
+        self.prebuilder.request(self.file_manager.build_extra_flags(board_profile), resources)
+
+    # Só está em dia se o registro aponta o mesmo build e a enumeração USB bate
+    # com o que esse build anuncia; o STATUS só confirma que o firmware está
+    # vivo. Os valores dele vêm da EEPROM, que o apply não grava (SPOOF/SAVE),
+    # então não servem para comparar com o perfil.
+    def device_state(self, port_info, board_profile, build_key):
+        if not port_info:
+            return False, "porta não encontrada"
+        known = self.registry.lookup(port_info)
+        if not known or known.get("build_key") != build_key:
+            return False, "firmware gravado difere do perfil"
+        mismatch = self.descriptor_mismatch(port_info, board_profile)
+        if mismatch:
+            return False, mismatch
+        ok, status = self.arduino_utils.read_status(port_info.device)
+        if not ok:
+            return False, status
+        return True, f"firmware em dia ({port_info.vid:04X}:{port_info.pid:04X})"
+
+    def descriptor_mismatch(self, port_info, board_profile):
+        if port_info.vid is None or port_info.pid is None:
+            return "porta sem descritor USB"
+        if board_profile.get("force_vid_pid"):
+            target = (int(board_profile["vid"], 16), int(board_profile["pid"], 16))
+            if (port_info.vid, port_info.pid) != target:
+                return (f"VID/PID enumerado {port_info.vid:04X}:{port_info.pid:04X} difere do perfil "
+                        f"{target[0]:04X}:{target[1]:04X}")
+        # Nem todo sistema expõe o iProduct (no Windows costuma vir vazio).
+        product = getattr(port_info, "product", None)
+        if board_profile.get("force_product_manufacturer") and product:
+            if product != board_profile["usb_product"]:
+                return f"iProduct enumerado '{product}' difere do perfil '{board_profile['usb_product']}'"
+        return None
 
-        self.log_message(" Firmware universal enviado, aguardando reconexão...")
-        self.progress_bar.setValue(100)
+    # Cada etapa declara o que consome e o que produz; o executor sobrepõe as
+    # independentes. Os nomes aparecem no caminho crítico e no histórico. A compilação recebe os flags do perfil como build property
+    # e não lê o extra_flags do boards.txt: espera a verificação do dispositivo
+    # (nada muda, nada compila) e a limpeza do cache do arduino-cli, que renomeia
+    # os diretórios que ela usa; roda junto com backup e escrita.
+    def spoof_pipeline(self, port, arduino_path, board_profile, label, force_full=False, op=None):
+        extra_flags = self.file_manager.build_extra_flags(board_profile)
+        build_key = self.prebuilder.build_key(extra_flags)
+        cancel_event = threading.Event()
+
+        def find_port():
+            port_info = self.arduino_utils.find_port_info(port)
+            if port_info and op:
+                op.location = port_info.location
+            return port_info, port_identity(port_info) if port_info else None
+
+        def check_boards():
+            ok, msg = self.file_manager.boards_state(arduino_path, board_profile)
+            self.log_async(f" Pré-verificação: boards.txt: {msg}")
+            return ok
+
+        def check_device(port_info):
+            if force_full:
+                return False
+            ok, msg = self.device_state(port_info, board_profile, build_key)
+            self.log_async(f" Pré-verificação: {port}: {msg}")
+            return ok
+
+        def backup(boards_ok):
+            if boards_ok:
+                return None
+            path = self.file_manager.backup_boards_file(arduino_path)
+            if path:
+                self.log_async(f"Backup criado: {path}")
+            else:
+                self.log_async(" Não foi possível criar backup do boards.txt")
+            return path
+
+        def write_boards(boards_ok, backup):
+            if boards_ok:
+                self.log_async(" boards.txt já atualizado, pulando backup e modificação")
+                return False
+            if not self.file_manager.modify_boards_file(arduino_path, board_profile, backup=False, purge=False):
+                self.log_async(" Falha ao modificar boards.txt")
+                raise PipelineAbort((False, None))
+            self.log_async(f"boards.txt modificado para {label} ({board_profile['vid']}:{board_profile['pid']})")
+            return True
+
+        def plan(boards_written, device_ok):
+            if device_ok:
+                if boards_written:
+                    self.log_async(f" Firmware em {port} já corresponde ao perfil, pulando envio")
+                else:
+                    self.log_async(f" {label} já aplicado em {port}, nada a fazer")
+                raise PipelineAbort((True, None))
+
+        def record_previous(port_info, device_ok):
+            if not port_info or device_ok:
+                return
+            known = self.registry.lookup(port_info)
+            if known and known.get("firmware"):
+                self.log_async(f" {port}: firmware anterior {known['firmware']} ({known.get('profile', '-')})")
+            self.registry.record(port_info)
+
+        def purge_cache(boards_ok):
+            if not boards_ok:
+                self.file_manager._clean_arduino_cache()
+
+        def build(device_ok, cache_clean):
+            if device_ok:
+                return None
+            prebuilt = self.prebuilder.take(extra_flags)
+            if prebuilt:
+                return prebuilt
+            ok, build_path, msg = self.prebuilder.build(extra_flags, cancel_event)
+            if not ok:
+                if not cancel_event.is_set():
+                    self.log_async(f" Falha ao compilar universal_spoofer.ino: {msg}")
+                    for warning in self.arduino_utils.size_warnings(self.prebuilder.size_report(extra_flags) or {}):
+                        self.log_async(f" Aviso de tamanho: {warning}")
+                raise PipelineAbort((False, None))
+            return build_path
+
+        def report_size(build_dir):
+            report = self.prebuilder.size_report(extra_flags) if build_dir else None
+            if not report:
+                return
+            new, same_profile, latest = self.history.record_build(
+                "universal_spoofer", label, build_key, extra_flags, report)
+            message = f" Firmware: {format_size(report)}"
+            if same_profile:
+                message += f"; {format_size_delta(report, same_profile)} vs build anterior deste perfil"
+            if latest and latest["profile"] != label:
+                message += f"; {format_size_delta(report, latest)} vs {latest['profile']}"
+            self.log_async(message)
+            for warning in self.arduino_utils.size_warnings(report):
+                self.log_async(f" Aviso de tamanho: {warning}")
+
+        def upload(plan, build_dir, previous):
+            self.log_async(" Enviando firmware universal...")
+            ok, out, err = self.arduino_utils.upload_sketch(
+                port, arduino_path, mode="universal", input_dir=build_dir
+            )
+            if not ok:
+                self.log_async(f" Falha ao enviar universal_spoofer.ino: {err or out}")
+                raise PipelineAbort((False, None))
+            self.log_async(" Firmware universal enviado, aguardando reconexão...")
+
+        def reconnect(uploaded, identity, port_info):
+            expected_ids = None
+            if board_profile.get("force_vid_pid"):
+                expected_ids = {(int(board_profile["vid"], 16), int(board_profile["pid"], 16))}
+            previous_ids = (port_info.vid, port_info.pid) if port_info else None
+            new_port = self.arduino_utils.wait_for_reconnection(
+                port, identity=identity, expected_ids=expected_ids, previous_ids=previous_ids)
+            if not new_port:
+                self.log_async(" Arduino não reconectou dentro do prazo")
+                raise PipelineAbort((True, None))
+            return new_port
+
+        def register(new_port):
+            new_info = self.arduino_utils.find_port_info(new_port)
+            if new_info:
+                self.registry.record(new_info, firmware="universal_spoofer", profile=label, build_key=build_key)
+            self.log_async(f" Arduino reconectado em {new_port}")
+
+        pipeline = Pipeline([
+            Stage("achar porta", find_port, outputs=("port_info", "identity")),
+            Stage("checar boards", check_boards, outputs=("boards_ok",)),
+            Stage("checar placa", check_device, inputs=("port_info",), outputs=("device_ok",)),
+            Stage("fazer backup", backup, inputs=("boards_ok",), outputs=("backup",)),
+            Stage("gravar boards", write_boards, inputs=("boards_ok", "backup"), outputs=("boards_written",)),
+            Stage("planejar", plan, inputs=("boards_written", "device_ok"), outputs=("plan",)),
+            Stage("anotar placa", record_previous, inputs=("port_info", "device_ok"), outputs=("previous",)),
+            Stage("limpar cache", purge_cache, inputs=("boards_ok",), outputs=("cache_clean",)),
+            Stage("compilar", build, inputs=("device_ok", "cache_clean"), outputs=("build_dir",)),
+            Stage("medir tamanho", report_size, inputs=("build_dir",)),
+            Stage("enviar", upload, inputs=("plan", "build_dir", "previous"), outputs=("uploaded",)),
+            Stage("reconectar", reconnect, inputs=("uploaded", "identity", "port_info"), outputs=("new_port",)),
+            Stage("registrar", register, inputs=("new_port",))
+        ])
+        return pipeline, cancel_event
+
+    def apply_spoof(self, port, arduino_path, board_profile, label, force_full=False, op=None):
+        pipeline, cancel_event = self.spoof_pipeline(port, arduino_path, board_profile, label, force_full, op)
+        run = pipeline.run(cancel_event)
+        if op:
+            op.add_pipeline(run)
+        self.log_async(f" Caminho crítico: {run.summary()}")
+        if run.aborted:
+            return run.aborted.result
+        return True, run.values.get("new_port")
+
+    def on_spoof_finished(self, result):
+        self.spoof_btn.setEnabled(True)
+        ok, new_port = result
+        if ok:
+            self.progress_bar.setValue(100)
+        if new_port:
+            self.refresh_ports()
+            index = self.port_combo.findData(new_port)
+            if index >= 0:
+                self.port_combo.setCurrentIndex(index)
+
+    def upload_resources(self, port, arduino_path, mode):
+        resources = [port_resource(port), build_resource(self.arduino_utils.get_sketch_path(mode))]
+        boards_path = self.file_manager._find_boards_file(arduino_path) if arduino_path else None
+        if boards_path:
+            resources.append(boards_resource(boards_path))
+        return resources
+
+    def run_operation(self, name, fn, resources, on_done=None, on_error=None, op=None):
+        if self.scheduler.is_busy(resources[0]):
+            self.log_message(f" {name}: aguardando operação em andamento no mesmo recurso...")
+        if op is None:
+            kind, _, port = name.partition(" ")
+            op = self.history.begin(kind, port or None)
+
+        def _done(future):
+            if not future.cancelled():
+                op.finish_future(future)
+
+            def _deliver():
+                try:
+                    result = future.result()
+                except Exception as e:
+                    self.log_message(f" Erro em {name}: {e}")
+                    if on_error:
+                        on_error()
+                    return
+                if on_done:
+                    on_done(result)
+            self.ui_call.emit(_deliver)
+
+        future = self.scheduler.submit(name, fn, resources=resources)
+        future.add_done_callback(_done)
+        return future
+
+    def log_async(self, message):
+        self.ui_call.emit(lambda: self.log_message(message))
 
     def validate_inputs(self):
         if not self.port_combo.currentData():
@@ -457,8 +864,12 @@ class ArduinoSpooferApp(QMainWindow):
         if not port:
             self.log_message("Nenhuma porta selecionada para teste")
             return
-        resp = self.spoof_engine.get_status(port)
-        self.log_message(f"STATUS: {resp}")
+        self.run_operation(
+            f"status {port}",
+            lambda: self.spoof_engine.get_status(port),
+            [port_resource(port)],
+            lambda resp: self.log_message(f"STATUS: {resp}")
+        )
 
     def test_spoof(self):
         port = self.port_combo.currentData()
@@ -473,53 +884,89 @@ class ArduinoSpooferApp(QMainWindow):
             return
         vid = profile["vid"]
         pid = profile["pid"]
-        resp = self.spoof_engine.spoof(port, vid, pid)
-        self.log_message(f"SPOOF: {resp}")
+        self.run_operation(
+            f"spoof-test {port}",
+            lambda: self.spoof_engine.spoof(port, vid, pid),
+            [port_resource(port)],
+            lambda resp: self.log_message(f"SPOOF: {resp}")
+        )
 
     def load_settings(self):
         try:
-            if os.path.exists('config.json'):
-                with open('config.json', 'r', encoding='utf-8') as f:
-                    saved_config = json.load(f)
-                    self.config.update(saved_config)
-                    self.path_edit_spoofer.setText(self.config.get('arduino_path', ''))
-                    self.path_edit_config.setText(self.config.get('arduino_path', ''))
-                    self.chk_force_vid_pid.setChecked(self.config.get('force_vid_pid', False))
-                    self.chk_force_product_manufacturer.setChecked(self.config.get('force_product_manufacturer', False))
+            self.apply_settings(self.settings.as_dict())
         except Exception as e:
             self.log_message(f"Erro ao carregar config inicial: {e}")
+        self.connect_settings_signals()
+        self.watch_boards_file(self.path_edit_spoofer.text().strip())
+
+    def apply_settings(self, settings):
+        arduino_path = settings.get('arduino_path', '')
+        if arduino_path:
+            self.path_edit_spoofer.setText(arduino_path)
+            self.path_edit_config.setText(arduino_path)
+        brand = settings.get('selected_brand', '')
+        model = settings.get('selected_model', '')
+        if brand in self.mouse_profiles:
+            self.brand_combo.setCurrentText(brand)
+            if model in self.mouse_profiles[brand]:
+                self.model_combo.setCurrentText(model)
+        port_index = self.port_combo.findData(settings.get('selected_port', ''))
+        if port_index >= 0:
+            self.port_combo.setCurrentIndex(port_index)
+        self.fw_combo.setCurrentText(settings.get('firmware_mode', 'universal'))
+        self.chk_force_vid_pid.setChecked(settings.get('force_vid_pid', False))
+        self.chk_force_product_manufacturer.setChecked(settings.get('force_product_manufacturer', False))
+        self.chk_verify_bootloader.setChecked(settings.get('verify_bootloader_touch', False))
+        self.chk_verify_flash.setChecked(settings.get('verify_flash_fallback', False))
+        self.chk_force_full_apply.setChecked(settings.get('force_full_apply', False))
+
+    def connect_settings_signals(self):
+        self.path_edit_spoofer.textChanged.connect(lambda text: self.settings.set('arduino_path', text))
+        self.brand_combo.currentTextChanged.connect(lambda text: self.settings.set('selected_brand', text))
+        self.model_combo.currentTextChanged.connect(lambda text: self.settings.set('selected_model', text))
+        self.port_combo.currentIndexChanged.connect(
+            lambda _: self.settings.set('selected_port', self.port_combo.currentData() or ''))
+        self.fw_combo.currentTextChanged.connect(lambda text: self.settings.set('firmware_mode', text))
+        self.chk_force_vid_pid.toggled.connect(lambda checked: self.settings.set('force_vid_pid', checked))
+        self.chk_force_product_manufacturer.toggled.connect(
+            lambda checked: self.settings.set('force_product_manufacturer', checked))
+        self.chk_verify_bootloader.toggled.connect(
+            lambda checked: self.settings.set('verify_bootloader_touch', checked))
+        self.chk_verify_flash.toggled.connect(lambda checked: self.settings.set('verify_flash_fallback', checked))
+        self.chk_force_full_apply.toggled.connect(lambda checked: self.settings.set('force_full_apply', checked))
+
+        self.model_combo.currentTextChanged.connect(lambda _: self.schedule_prebuild())
+        self.chk_force_vid_pid.toggled.connect(lambda _: self.schedule_prebuild())
+        self.chk_force_product_manufacturer.toggled.connect(lambda _: self.schedule_prebuild())
+        self.schedule_prebuild()
 
     def save_config(self):
         try:
-            self.config['force_vid_pid'] = self.chk_force_vid_pid.isChecked()
-            self.config['force_product_manufacturer'] = self.chk_force_product_manufacturer.isChecked()
-            self.config['arduino_path'] = self.path_edit_spoofer.text()
-            with open('config.json', 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=4)
+            self.settings.update({
+                'force_vid_pid': self.chk_force_vid_pid.isChecked(),
+                'force_product_manufacturer': self.chk_force_product_manufacturer.isChecked(),
+                'arduino_path': self.path_edit_spoofer.text()
+            })
+            self.settings.save_now()
             self.log_message("Configurações salvas em config.json!")
         except Exception as e:
             self.log_message(f"Erro ao salvar configuração: {e}")
 
     def load_config(self):
         try:
-            if os.path.exists('config.json'):
-                with open('config.json', 'r', encoding='utf-8') as f:
-                    saved = json.load(f)
-                    self.config.update(saved)
-                    self.path_edit_spoofer.setText(self.config.get('arduino_path', ''))
-                    self.path_edit_config.setText(self.config.get('arduino_path', ''))
-                    brand = self.config.get('selected_brand', '')
-                    model = self.config.get('selected_model', '')
-                    if brand in self.mouse_profiles:
-                        self.brand_combo.setCurrentText(brand)
-                        if model in self.mouse_profiles[brand]:
-                            self.model_combo.setCurrentText(model)
-                    self.chk_force_vid_pid.setChecked(self.config.get('force_vid_pid', False))
-                    self.chk_force_product_manufacturer.setChecked(self.config.get('force_product_manufacturer', False))
-                self.log_message("Configuração carregada de config.json!")
+            self.apply_settings(self.settings.reload())
+            self.log_message("Configuração carregada de config.json!")
         except Exception as e:
             self.log_message(f"Erro ao carregar configuração: {e}")
 
+    def closeEvent(self, event):
+        self.settings.flush()
+        latency.flush()
+        self.prebuilder.cancel()
+        self.scheduler.shutdown()
+        self.history.close()
+        super().closeEvent(event)
+
     def show_about(self):
         QMessageBox.about(self, "Sobre","Arduino Mouse Spoofer automatico\n\n \tFeito por Lyrien")
 
@@ -3,9 +3,66 @@ import serial.tools.list_ports
 import subprocess
 import time
 import os
-import json
+import re
+
+from utils.device_registry import resolve_identity
+from utils.latency_model import latency
+from utils.serial_capture import open_serial, port_back, port_gone
+from utils.toolchain import toolchain
+from utils.usb_ids import lookup_usb_names
+
+SKETCHES = {
+    "universal": "universal_spoofer",
+    "reset": "reset_arduino",
+    "blink": "blink_test",
+    "echo": "echo_test"
+}
+
+FQBN = "arduino:avr:leonardo"
+
+BOOTLOADER_IDS = {(0x2341, 0x0036), (0x2A03, 0x0036)}
+
+FIRMWARE_SIGNATURES = (
+    ("UNIVERSAL_SPOOFER_READY", "universal_spoofer"),
+    ("STATUS:VID=", "universal_spoofer"),
+    ("HID_ACTIVE:", "universal_spoofer"),
+    ("ERROR:UNKNOWN_COMMAND", "universal_spoofer"),
+    ("BLINK_TEST_READY", "blink_test"),
+    ("LED ON", "blink_test"),
+    ("LED OFF", "blink_test"),
+    ("TEST_COMPLETE", "blink_test")
+)
+
+VERIFY_DEADLINES = {
+    "banner": 1.5,
+    "bootloader": 4.0
+}
+
+# Relatório de tamanho impresso pelo arduino-cli ao fim de cada compilação;
+# os máximos vêm de upload.maximum_size/maximum_data_size do boards.txt.
+SIZE_PATTERNS = {
+    "flash": re.compile(r"Sketch uses (\d+) bytes.*?Maximum is (\d+) bytes"),
+    "ram": re.compile(r"Global variables use (\d+) bytes.*?Maximum is (\d+) bytes")
+}
+SIZE_WARN_RATIO = 0.9
+
+# Linha que encerra a resposta de cada comando do universal_spoofer. Depois de
+# um reset o setup() imprime o banner, que não pode ser tomado como resposta.
+COMMAND_REPLIES = {
+    "STATUS": ("STATUS:",),
+    "SPOOF": ("SPOOF_SUCCESS",),
+    "SAVE": ("CONFIG_SAVED",),
+    "RESET": ("RESET_SUCCESS",),
+    "TEST_MOUSE": ("TEST_MOUSE:",)
+}
+REPLY_ERROR = "ERROR:"
 
 class ArduinoUtils:
+    @staticmethod
+    def get_sketch_path(mode):
+        sketch = SKETCHES.get(mode)
+        return os.path.join("firmware", sketch) if sketch else None
+
     @staticmethod
     def detect_arduino_ports():
         ports = []
@@ -26,36 +83,108 @@ class ArduinoUtils:
         return ports
 
     @staticmethod
-    def upload_sketch(port, arduino_path="", mode="universal"):
-        try:
-            if mode == "universal":
-                sketch_path = os.path.join("firmware", "universal_spoofer")
-            elif mode == "reset":
-                sketch_path = os.path.join("firmware", "reset_arduino")
-            elif mode == "blink":
-                sketch_path = os.path.join("firmware", "blink_test")
-            elif mode == "echo":
-                sketch_path = os.path.join("firmware", "echo_test")
+    def get_cli_path():
+        return toolchain.cli_path()
+
+    @staticmethod
+    def run_process(cmd, cancel_event=None, low_priority=False, timeout=None):
+        kwargs = {}
+        if low_priority:
+            if os.name == "nt":
+                kwargs["creationflags"] = subprocess.BELOW_NORMAL_PRIORITY_CLASS
             else:
+                kwargs["preexec_fn"] = lambda: os.nice(10)
+
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, **kwargs)
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            try:
+                out, err = proc.communicate(timeout=0.2)
+                return proc.returncode, out, err
+            except subprocess.TimeoutExpired:
+                cancelled = cancel_event is not None and cancel_event.is_set()
+                expired = deadline is not None and time.monotonic() > deadline
+                if cancelled or expired:
+                    proc.kill()
+                    out, err = proc.communicate()
+                    reason = "Cancelado" if cancelled else "Timeout"
+                    return None, out, f"{reason}: {' '.join(cmd[:2])}"
+
+    @staticmethod
+    def compile_sketch(mode="universal", build_path=None, build_properties=None,
+                       cancel_event=None, low_priority=False):
+        try:
+            sketch_path = ArduinoUtils.get_sketch_path(mode)
+            if not sketch_path:
                 return False, "", f"Modo desconhecido: {mode}"
 
             if not os.path.exists(sketch_path):
                 return False, "", f"Sketch não encontrado: {sketch_path}"
 
-            cli_path = os.path.join("utils", "arduino-cli.exe")
-            cli_path = os.path.abspath(cli_path)
+            cli_path = ArduinoUtils.get_cli_path()
+            if not cli_path:
+                return False, "", "arduino-cli não encontrado (utils/ ou PATH)"
+
+            compile_cmd = [cli_path, "compile", "--fqbn", FQBN, sketch_path]
+            if build_path:
+                compile_cmd += ["--build-path", build_path]
+            for prop in build_properties or []:
+                compile_cmd += ["--build-property", prop]
+
+            code, out, err = ArduinoUtils.run_process(
+                compile_cmd, cancel_event=cancel_event, low_priority=low_priority
+            )
+            return code == 0, out, err
+        except Exception as e:
+            return False, "", str(e)
+
+    @staticmethod
+    def parse_size_report(output):
+        report = {}
+        for name, pattern in SIZE_PATTERNS.items():
+            match = pattern.search(output or "")
+            if match:
+                report[name] = int(match.group(1))
+                report[f"{name}_max"] = int(match.group(2))
+        return report or None
+
+    @staticmethod
+    def size_warnings(report, ratio=SIZE_WARN_RATIO):
+        warnings = []
+        labels = {"flash": "memória de programa", "ram": "memória dinâmica"}
+        for name, label in labels.items():
+            used, maximum = report.get(name), report.get(f"{name}_max")
+            if used is None or not maximum:
+                continue
+            if used > maximum:
+                warnings.append(f"{label} excede o limite: {used}/{maximum} bytes")
+            elif used >= maximum * ratio:
+                warnings.append(f"{label} perto do limite: {used}/{maximum} bytes ({used / maximum:.0%})")
+        return warnings
+
+    @staticmethod
+    def upload_sketch(port, arduino_path="", mode="universal", input_dir=None):
+        try:
+            sketch_path = ArduinoUtils.get_sketch_path(mode)
+            if not sketch_path:
+                return False, "", f"Modo desconhecido: {mode}"
 
-            if not os.path.exists(cli_path):
-                return False, "", f"arduino-cli.exe não encontrado em {cli_path}"
+            if not os.path.exists(sketch_path):
+                return False, "", f"Sketch não encontrado: {sketch_path}"
 
-            fqbn = "arduino:avr:leonardo"
+            cli_path = ArduinoUtils.get_cli_path()
+            if not cli_path:
+                return False, "", "arduino-cli não encontrado (utils/ ou PATH)"
 
-            compile_cmd = [cli_path, "compile", "--fqbn", fqbn, sketch_path]
-            compile_proc = subprocess.run(compile_cmd, capture_output=True, text=True)
-            if compile_proc.returncode != 0:
-                return False, compile_proc.stdout, compile_proc.stderr
+            if not input_dir:
+                ok, out, err = ArduinoUtils.compile_sketch(mode)
+                if not ok:
+                    return False, out, err
 
-            upload_cmd = [cli_path, "upload", "-p", port, "--fqbn", fqbn, sketch_path]
+            upload_cmd = [cli_path, "upload", "-p", port, "--fqbn", FQBN]
+            if input_dir:
+                upload_cmd += ["--input-dir", input_dir]
+            upload_cmd.append(sketch_path)
             upload_proc = subprocess.run(upload_cmd, capture_output=True, text=True)
 
             return upload_proc.returncode == 0, upload_proc.stdout, upload_proc.stderr
@@ -64,27 +193,49 @@ class ArduinoUtils:
             return False, "", str(e)
 
     @staticmethod
-    def send_command(port, command, baudrate=115200, timeout=2):
+    def read_lines(ser, end):
+        buffer = b""
+        while time.monotonic() < end:
+            chunk = ser.read(ser.in_waiting or 1)
+            if not chunk:
+                time.sleep(0.01)
+                continue
+            buffer += chunk
+            while b"\n" in buffer:
+                raw, buffer = buffer.split(b"\n", 1)
+                line = raw.decode(errors="ignore").strip()
+                if line:
+                    yield line
+
+    @staticmethod
+    def is_reply(command, line):
+        expected = COMMAND_REPLIES.get(command.upper(), ("SUCCESS", "STATUS:"))
+        return line.startswith(REPLY_ERROR) or any(line.startswith(token) for token in expected)
+
+    # O prazo vem das latências já observadas na porta para este comando; sem
+    # histórico vale o antigo total fixo (2s de espera + 0.5s + timeout). Um
+    # timeout explícito é o prazo mínimo. Só a linha final esperada encerra a
+    # espera; sem ela é falha, e o estouro alonga o prazo das próximas tentativas.
+    @staticmethod
+    def send_command(port, command, baudrate=115200, timeout=None):
+        name = command.split()[0] if command.strip() else command
         try:
-            with serial.Serial(port, baudrate, timeout=timeout) as ser:
-                time.sleep(2)
+            deadline = latency.deadline(port, "rtt", default=(timeout or 2) + 2.5, command=name, minimum=timeout)
+            with open_serial(port, baudrate, timeout=0) as ser:
                 ser.reset_input_buffer()
-
+                sent = time.monotonic()
                 ser.write(f"{command}\n".encode())
-                time.sleep(0.5)
 
-                response = ""
-                start_time = time.time()
-                while time.time() - start_time < timeout:
-                    if ser.in_waiting > 0:
-                        line = ser.readline().decode(errors="ignore").strip()
-                        if line:
-                            response += line + "\n"
-                            if any(keyword in line for keyword in ["SUCCESS", "ERROR", "STATUS", "READY"]):
-                                break
-                    time.sleep(0.1)
+                lines = []
+                for line in ArduinoUtils.read_lines(ser, sent + deadline):
+                    lines.append(line)
+                    if ArduinoUtils.is_reply(name, line):
+                        latency.observe(port, "rtt", time.monotonic() - sent, command=name)
+                        return True, "\n".join(lines)
 
-                return True, response.strip()
+                latency.timed_out(port, "rtt", command=name)
+                partial = "; ".join(lines)
+                return False, f"{name} sem resposta em {deadline:.1f}s" + (f" ({partial})" if partial else "")
 
         except Exception as e:
             return False, str(e)
@@ -123,11 +274,34 @@ class ArduinoUtils:
             "vid": port.vid,
             "pid": port.pid,
             "serial_number": port.serial_number,
-            "manufacturer": port.manufacturer
+            "manufacturer": port.manufacturer,
+            "product": port.product,
+            "location": port.location,
+            "usb_names": lookup_usb_names(port.vid, port.pid)
         } for port in ports]
 
     @staticmethod
-    def wait_for_reconnection(old_port, timeout=30, check_interval=1):
+    def wait_for_reconnection(old_port, timeout=None, check_interval=None, identity=None, expected_ids=None,
+                              previous_ids=None):
+        timeout = latency.deadline(old_port, "reenum", minimum=timeout)
+        if check_interval is None:
+            check_interval = latency.poll_interval(old_port, "reenum")
+        started = time.monotonic()
+        new_port = ArduinoUtils._wait_for_port(old_port, timeout, check_interval, identity, expected_ids,
+                                               previous_ids)
+        if new_port:
+            latency.observe(old_port, "reenum", time.monotonic() - started)
+            port_back(old_port, new_port)
+        else:
+            latency.timed_out(old_port, "reenum")
+        return new_port
+
+    @staticmethod
+    def _wait_for_port(old_port, timeout, check_interval, identity, expected_ids, previous_ids):
+        if identity and (identity.get("serial_number") or identity.get("location")):
+            return ArduinoUtils._wait_for_identity(old_port, identity, timeout, expected_ids, check_interval,
+                                                   previous_ids)
+
         print(f"Aguardando reconexão do Arduino (porta {old_port})...")
         start_time = time.time()
 
@@ -136,6 +310,7 @@ class ArduinoUtils:
             old_port_exists = any(p['device'] == old_port for p in ports)
 
             if not old_port_exists:
+                port_gone(old_port)
                 break
 
             time.sleep(check_interval)
@@ -156,6 +331,35 @@ class ArduinoUtils:
         print("Timeout aguardando reconexão do Arduino")
         return None
 
+    @staticmethod
+    def _wait_for_identity(old_port, identity, timeout, expected_ids, check_interval, previous_ids=None):
+        # Chamado depois do upload, quando o bootloader já rodou: qualquer
+        # enumeração fora do bootloader é o sketch novo, mesmo que a placa
+        # tenha voltado antes do primeiro poll. Com IDs esperados (VID/PID
+        # forçado), um ID diferente só vale após sumir ou se mudou desde o
+        # início da gravação.
+        print(f"Aguardando reconexão do Arduino (porta {old_port}, {identity})...")
+        end = time.monotonic() + timeout
+        seen_gone = False
+        while time.monotonic() < end:
+            ports = ArduinoUtils.list_all_serial_ports()
+            match = resolve_identity(identity, ports)
+            if match is None:
+                if not seen_gone:
+                    port_gone(old_port)
+                seen_gone = True
+            else:
+                ids = (match["vid"], match["pid"])
+                if ids not in BOOTLOADER_IDS and (
+                        not expected_ids or ids in expected_ids or seen_gone
+                        or (previous_ids and ids != previous_ids)):
+                    print(f"Arduino reconectado na porta: {match['device']}")
+                    return match['device']
+            time.sleep(check_interval)
+
+        print("Timeout aguardando reconexão do Arduino")
+        return None
+
     @staticmethod
     def run_serial_tool(command_args):
         try:
@@ -195,31 +399,190 @@ class ArduinoUtils:
                 'manufacturer': port.manufacturer or "N/A",
                 'product': port.product or "N/A"
             }
+            vendor_name, product_name = lookup_usb_names(port.vid, port.pid)
+            port_info['vendor_name'] = vendor_name or "N/A"
+            port_info['product_name'] = product_name or "N/A"
             ports_info.append(port_info)
 
         return ports_info
 
     @staticmethod
-    def check_port_ready(port, baudrate=115200, timeout=3):
+    def check_port_ready(port, baudrate=115200, timeout=None):
+        try:
+            deadline = latency.deadline(port, "rtt", default=1.0, command="STATUS", minimum=timeout)
+            with open_serial(port, baudrate, timeout=0) as ser:
+                sent = time.monotonic()
+                ser.write(b"\nSTATUS\n")
+
+                for line in ArduinoUtils.read_lines(ser, sent + deadline):
+                    if ArduinoUtils.is_reply("STATUS", line):
+                        latency.observe(port, "rtt", time.monotonic() - sent, command="STATUS")
+                        return True, f"Porta respondendo: {line}"
+                latency.timed_out(port, "rtt", command="STATUS")
+                return False, "Porta não responde"
+
+        except serial.SerialException as e:
+            return False, f"Erro de comunicação: {str(e)}"
+        except Exception as e:
+            return False, f"Erro inesperado: {str(e)}"
+
+    @staticmethod
+    def find_port_info(port):
+        for info in serial.tools.list_ports.comports():
+            if info.device == port:
+                return info
+        return None
+
+    @staticmethod
+    def match_port_descriptor(port, known_ids):
+        info = ArduinoUtils.find_port_info(port)
+        if info is None:
+            return False, "Porta não enumerada"
+        if info.vid is None or info.pid is None:
+            return False, "Porta sem descritor USB"
+        ids = f"{info.vid:04X}:{info.pid:04X}"
+        if (info.vid, info.pid) in BOOTLOADER_IDS:
+            return True, f"Bootloader Caterina ativo ({ids})"
+        if (info.vid, info.pid) in known_ids:
+            return True, f"Descritor USB reconhecido ({ids}, {info.description})"
+        return False, f"Descritor USB desconhecido ({ids})"
+
+    @staticmethod
+    def identify_firmware(line):
+        for marker, firmware in FIRMWARE_SIGNATURES:
+            if marker in line:
+                return firmware
+        return None
+
+    # Sem banner o estouro não entra no modelo: a causa mais comum é a porta
+    # não ter o firmware, não uma placa lenta.
+    @staticmethod
+    def detect_firmware_banner(port, deadline=None, baudrate=115200):
+        deadline = latency.deadline(port, "banner", VERIFY_DEADLINES["banner"], minimum=deadline)
         try:
-            with serial.Serial(port, baudrate, timeout=timeout) as ser:
-                ser.write(b"\n")
-                time.sleep(0.5)
-
-                if ser.in_waiting > 0:
-                    response = ser.readline().decode().strip()
-                    return True, f"Porta respondendo: {response}"
-                else:
-                    ser.write(b"STATUS\n")
-                    time.sleep(0.5)
-
-                    if ser.in_waiting > 0:
-                        response = ser.readline().decode().strip()
-                        return True, f"Resposta ao STATUS: {response}"
-                    else:
-                        return False, "Porta não responde"
+            started = time.monotonic()
+            end = started + deadline
+            with open_serial(port, baudrate, timeout=0) as ser:
+                buffer = b""
+                probe_at = time.monotonic() + min(0.2, deadline / 4)
+                probed = False
+                while time.monotonic() < end:
+                    if not probed and time.monotonic() >= probe_at:
+                        ser.write(b"STATUS\n")
+                        probed = True
+
+                    chunk = ser.read(ser.in_waiting or 1)
+                    if not chunk:
+                        time.sleep(0.01)
+                        continue
+
+                    buffer += chunk
+                    while b"\n" in buffer:
+                        raw, buffer = buffer.split(b"\n", 1)
+                        line = raw.decode(errors="ignore").strip()
+                        firmware = ArduinoUtils.identify_firmware(line)
+                        if firmware:
+                            latency.observe(port, "banner", time.monotonic() - started)
+                            return True, firmware, line
+            return False, None, "Nenhum banner de firmware dentro do prazo"
+        except serial.SerialException as e:
+            return False, None, f"Erro de comunicação: {str(e)}"
+        except Exception as e:
+            return False, None, f"Erro inesperado: {str(e)}"
 
+    @staticmethod
+    def parse_status_line(line):
+        if not line.startswith("STATUS:"):
+            return None
+        status = {}
+        for part in line[len("STATUS:"):].split(","):
+            key, sep, value = part.partition("=")
+            if sep:
+                status[key.strip().lower()] = value.strip()
+        return status
+
+    @staticmethod
+    def read_status(port, deadline=None, baudrate=115200):
+        deadline = latency.deadline(port, "rtt", VERIFY_DEADLINES["banner"], command="STATUS", minimum=deadline)
+        try:
+            with open_serial(port, baudrate, timeout=0) as ser:
+                ser.reset_input_buffer()
+                sent = time.monotonic()
+                ser.write(b"STATUS\n")
+                for line in ArduinoUtils.read_lines(ser, sent + deadline):
+                    status = ArduinoUtils.parse_status_line(line)
+                    if status is not None:
+                        latency.observe(port, "rtt", time.monotonic() - sent, command="STATUS")
+                        return True, status
+            latency.timed_out(port, "rtt", command="STATUS")
+            return False, "STATUS sem resposta dentro do prazo"
         except serial.SerialException as e:
             return False, f"Erro de comunicação: {str(e)}"
         except Exception as e:
-            return False, f"Erro inesperado: {str(e)}"
\ No newline at end of file
+            return False, f"Erro inesperado: {str(e)}"
+
+    @staticmethod
+    def detect_bootloader(port, deadline=None):
+        deadline = latency.deadline(port, "bootloader", VERIFY_DEADLINES["bootloader"], minimum=deadline)
+        try:
+            before = {p.device for p in serial.tools.list_ports.comports()}
+            with serial.Serial(port, 1200) as ser:
+                ser.dtr = False
+
+            started = time.monotonic()
+            end = started + deadline
+            interval = latency.poll_interval(port, "bootloader")
+            while time.monotonic() < end:
+                for info in serial.tools.list_ports.comports():
+                    if (info.vid, info.pid) in BOOTLOADER_IDS:
+                        if info.device == port or info.device not in before:
+                            latency.observe(port, "bootloader", time.monotonic() - started)
+                            return True, f"Bootloader respondeu em {info.device}"
+                time.sleep(interval)
+            return False, "Bootloader não apareceu após toque de 1200bps"
+        except serial.SerialException as e:
+            return False, f"Erro de comunicação: {str(e)}"
+        except Exception as e:
+            return False, f"Erro inesperado: {str(e)}"
+
+    @staticmethod
+    def verify_port(port, known_ids, bootloader_touch=False, flash_fallback=False,
+                    arduino_path="", deadlines=None):
+        deadlines = dict({
+            "banner": latency.deadline(port, "banner", VERIFY_DEADLINES["banner"]),
+            "bootloader": latency.deadline(port, "bootloader", VERIFY_DEADLINES["bootloader"])
+        }, **(deadlines or {}))
+        attempts = []
+
+        # Um VID/PID do catálogo também aparece em mouses reais e em placas já
+        # spoofadas; o descritor só confirma junto com a resposta do firmware.
+        # O bootloader não responde serial, então o ID dele basta.
+        info = ArduinoUtils.find_port_info(port)
+        if info is not None and (info.vid, info.pid) in BOOTLOADER_IDS:
+            return True, "bootloader", f"Bootloader Caterina ativo ({info.vid:04X}:{info.pid:04X})", None
+        descriptor_ok, descriptor_msg = ArduinoUtils.match_port_descriptor(port, known_ids)
+
+        ok, firmware, msg = ArduinoUtils.detect_firmware_banner(port, deadlines["banner"])
+        if ok:
+            if descriptor_ok:
+                return True, "descriptor", f"{descriptor_msg}; firmware {firmware} respondeu: {msg}", firmware
+            return True, "banner", f"Firmware {firmware} respondeu: {msg}", firmware
+        if descriptor_ok:
+            attempts.append(f"{descriptor_msg}, mas sem resposta do firmware")
+        else:
+            attempts.append(descriptor_msg)
+        attempts.append(msg)
+
+        if bootloader_touch:
+            ok, msg = ArduinoUtils.detect_bootloader(port, deadlines["bootloader"])
+            if ok:
+                return True, "bootloader", msg, None
+            attempts.append(msg)
+
+        if flash_fallback:
+            ok, out, err = ArduinoUtils.upload_sketch(port, arduino_path, mode="blink")
+            if ok:
+                return True, "flash", "blink_test gravado com sucesso", "blink_test"
+            attempts.append(f"Falha ao enviar blink_test.ino: {err or out}")
+
+        return False, None, " | ".join(attempts), None
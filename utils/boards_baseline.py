@@ -0,0 +1,115 @@
+import hashlib
+import os
+import threading
+
+from utils.file_watcher import stat_signature
+
+# Só estes blocos são reescritos pelo spoofer; o resto do boards.txt varia
+# entre versões do core e não indica rastro.
+SPOOFED_BLOCKS = ("leonardo", "menu")
+
+
+def parse_boards_lines(lines):
+    entries = {}
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#") or "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        entries[key.strip()] = value.strip()
+    return entries
+
+
+def parse_boards(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_boards_lines(f)
+
+
+def split_blocks(entries):
+    blocks = {}
+    for key, value in entries.items():
+        board = key.split(".", 1)[0]
+        blocks.setdefault(board, {})[key] = value
+    return blocks
+
+
+def block_hash(block):
+    digest = hashlib.sha1()
+    for key in sorted(block):
+        digest.update(f"{key}={block[key]}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BoardsBaseline:
+    _cache = {}
+    _cache_lock = threading.Lock()
+
+    def __init__(self, template_path):
+        self.template_path = os.path.abspath(template_path)
+        self.signature = stat_signature(self.template_path)
+        self.file_hash = file_hash(self.template_path)
+        self.key_index = parse_boards(self.template_path)
+        self.blocks = split_blocks(self.key_index)
+        self.block_hashes = {board: block_hash(block) for board, block in self.blocks.items()}
+
+    @classmethod
+    def load(cls, template_path):
+        template_path = os.path.abspath(template_path)
+        with cls._cache_lock:
+            baseline = cls._cache.get(template_path)
+            if baseline is None or baseline.signature != stat_signature(template_path):
+                baseline = cls(template_path)
+                cls._cache[template_path] = baseline
+            return baseline
+
+    def usb_ids(self, board):
+        block = self.blocks.get(board, {})
+        ids = set()
+        for key, vid in block.items():
+            parts = key.split(".")
+            if len(parts) == 3 and parts[1] == "vid":
+                pid = block.get(f"{board}.pid.{parts[2]}")
+                if pid:
+                    ids.add((int(vid, 16), int(pid, 16)))
+        return ids
+
+    def diff_block(self, board, block):
+        expected = self.blocks.get(board, {})
+        for key, value in block.items():
+            if key not in expected:
+                return f" Rastro detectado: chave extra '{key}'"
+            if value != expected[key]:
+                if key.endswith(".build.extra_flags"):
+                    return f" Rastro detectado: extra_flags adulterado  {value}"
+                return f" Rastro detectado: {key} esperado '{expected[key]}', encontrado '{value}'"
+        for key in expected:
+            if key not in block:
+                return f" Rastro detectado: chave removida '{key}'"
+        return None
+
+    def check(self, boards_path):
+        if file_hash(boards_path) == self.file_hash:
+            return False, " boards.txt está no padrão original"
+
+        blocks = split_blocks(parse_boards(boards_path))
+        for board in SPOOFED_BLOCKS:
+            if board not in self.block_hashes:
+                continue
+            block = blocks.get(board)
+            if block is None:
+                return True, f" Rastro detectado: bloco '{board}' ausente"
+            if block_hash(block) == self.block_hashes[board]:
+                continue
+            message = self.diff_block(board, block)
+            if message:
+                return True, message
+
+        return False, " boards.txt está no padrão original"
@@ -0,0 +1,92 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+
+TRASH_DIR_NAME = ".spoofer-trash"
+
+
+def trash_dir_for(path):
+    # Mesmo diretório pai = mesmo sistema de arquivos, então o rename é atômico.
+    return os.path.join(os.path.dirname(os.path.abspath(path)), TRASH_DIR_NAME)
+
+
+def _lower_thread_priority():
+    try:
+        if hasattr(os, "setpriority") and hasattr(threading, "get_native_id"):
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except OSError:
+        pass
+
+
+class CachePurger:
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="CachePurger", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        _lower_thread_priority()
+        while True:
+            kind, target = self._queue.get()
+            try:
+                if kind == "tree":
+                    shutil.rmtree(target, ignore_errors=True)
+                elif kind == "cli":
+                    subprocess.run([target, "cache", "clean"], capture_output=True, timeout=30)
+            except Exception as e:
+                print(f" Erro na limpeza em segundo plano ({target}): {e}")
+            finally:
+                self._queue.task_done()
+
+    def retire(self, path):
+        if not os.path.exists(path):
+            return None
+        trash = trash_dir_for(path)
+        os.makedirs(trash, exist_ok=True)
+        name = f"{os.path.basename(path)}-{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        target = os.path.join(trash, name)
+        os.rename(path, target)
+        self._queue.put(("tree", target))
+        self._ensure_worker()
+        return target
+
+    def purge(self, paths, cli_path=None):
+        retired = []
+        for path in paths:
+            try:
+                if self.retire(path):
+                    retired.append(path)
+                    print(f" Diretório temporário descartado: {path}")
+            except OSError as e:
+                print(f" Não foi possível mover {path} para a lixeira: {e}")
+        if cli_path:
+            self._queue.put(("cli", cli_path))
+            self._ensure_worker()
+        return retired
+
+    # Restos de uma execução interrompida: o rename já aconteceu, só falta apagar.
+    def recover(self, paths):
+        found = 0
+        for trash in {trash_dir_for(p) for p in paths}:
+            if not os.path.isdir(trash):
+                continue
+            for name in os.listdir(trash):
+                self._queue.put(("tree", os.path.join(trash, name)))
+                found += 1
+        if found:
+            self._ensure_worker()
+        return found
+
+    def wait(self):
+        self._queue.join()
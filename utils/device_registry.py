@@ -0,0 +1,120 @@
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+
+def port_identity(port_info):
+    get = port_info.get if isinstance(port_info, dict) else lambda k: getattr(port_info, k, None)
+    serial_number = get("serial_number")
+    location = get("location")
+    if serial_number in ("", "N/A"):
+        serial_number = None
+    if location in ("", "N/A"):
+        location = None
+    return {"serial_number": serial_number, "location": location}
+
+
+# Localização física pesa mais que o número de série: o core AVR deriva o
+# serial dos módulos USB do sketch, então ele muda junto com o firmware e
+# várias placas podem compartilhar o mesmo. Locais diferentes nunca casam.
+def match_score(candidate, identity, serial_counts):
+    score = 0
+    if identity["location"] and candidate.get("location"):
+        if candidate["location"] != identity["location"]:
+            return 0
+        score += 2
+    serial_number = identity["serial_number"]
+    if serial_number and candidate.get("serial_number") == serial_number and serial_counts.get(serial_number) == 1:
+        score += 1
+    return score
+
+
+def best_match(candidates, identity):
+    serial_counts = {}
+    for candidate in candidates:
+        sn = port_identity(candidate)["serial_number"]
+        if sn:
+            serial_counts[sn] = serial_counts.get(sn, 0) + 1
+
+    best, best_score, tied = None, 0, False
+    for candidate in candidates:
+        score = match_score(port_identity(candidate), identity, serial_counts)
+        if score > best_score:
+            best, best_score, tied = candidate, score, False
+        elif score and score == best_score:
+            tied = True
+    return None if tied else best
+
+
+def resolve_identity(identity, ports):
+    return best_match(ports, port_identity(identity))
+
+
+class DeviceRegistry:
+    def __init__(self, path="devices.json"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._devices = None
+
+    def _ensure_loaded(self):
+        if self._devices is not None:
+            return
+        self._devices = []
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._devices = json.load(f).get("devices", [])
+        except Exception as e:
+            print(f"[DeviceRegistry] Erro ao ler {self.path}: {e}")
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".devices.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"devices": self._devices}, f, indent=4)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            print(f"[DeviceRegistry] Erro ao salvar {self.path}: {e}")
+
+    def _find(self, identity):
+        return best_match(self._devices, identity)
+
+    def lookup(self, port_info):
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._find(port_identity(port_info))
+            return dict(entry) if entry else None
+
+    def record(self, port_info, firmware=None, profile=None, build_key=None):
+        identity = port_identity(port_info)
+        if not identity["serial_number"] and not identity["location"]:
+            return None
+
+        get = port_info.get if isinstance(port_info, dict) else lambda k: getattr(port_info, k, None)
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._find(identity)
+            if entry is None:
+                entry = {}
+                self._devices.append(entry)
+            entry.update({k: v for k, v in identity.items() if v})
+            entry.update({
+                "device": get("device"),
+                "vid": get("vid"),
+                "pid": get("pid"),
+                "description": get("description"),
+                "last_seen": datetime.now().isoformat(timespec="seconds")
+            })
+            if firmware is not None:
+                entry["firmware"] = firmware
+            if profile is not None:
+                entry["profile"] = profile
+            if build_key is not None:
+                entry["build_key"] = build_key
+            self._save()
+            return dict(entry)
@@ -1,15 +1,36 @@
 import os
 import shutil
-import subprocess
+import threading
 from datetime import datetime
 
+from utils.boards_baseline import BoardsBaseline, parse_boards, parse_boards_lines
+from utils.cache_purger import CachePurger
+from utils.file_watcher import FileWatcher, stat_signature
+from utils.toolchain import toolchain
+
 class FileManager:
     def __init__(self):
         self.backup_dir = "backups"
         os.makedirs(self.backup_dir, exist_ok=True)
         self.template_file = os.path.join("boards_templates", "boards.txt")
+        self.default_template_file = os.path.join("boards_templates", "default_boards.txt")
+        self._verdict_cache = {}
+        self._verdict_lock = threading.Lock()
+        self._boards_watcher = None
+        self._boards_paths = {}
+        self.cache_purger = CachePurger()
+        self.cache_purger.recover(toolchain.temp_dirs())
 
     def _find_boards_file(self, arduino_path):
+        cached = self._boards_paths.get(arduino_path)
+        if cached and os.path.exists(cached):
+            return cached
+        boards_path = self._search_boards_file(arduino_path)
+        if boards_path:
+            self._boards_paths[arduino_path] = boards_path
+        return boards_path
+
+    def _search_boards_file(self, arduino_path):
         possible_paths = [
             os.path.join(arduino_path, "packages", "arduino", "hardware", "avr"),
             os.path.join(arduino_path, "hardware", "arduino", "avr"),
@@ -50,7 +71,42 @@ class FileManager:
             print(f" Erro na restauração: {e}")
             return False
 
-    def modify_boards_file(self, arduino_path, profile):
+    @staticmethod
+    def build_extra_flags(profile):
+        flags = []
+        if profile.get("force_vid_pid", False):
+            flags.append(f"-DUSB_VID={profile['vid']} -DUSB_PID={profile['pid']}")
+        if profile.get("force_product_manufacturer", False):
+            usb_product = profile.get("usb_product", profile.get("product", "Arduino Leonardo"))
+            usb_manufacturer = profile.get("usb_manufacturer", profile.get("manufacturer", "Arduino"))
+
+            flags.append(f'-DUSB_PRODUCT="{usb_product}"')
+            flags.append(f'-DUSB_MANUFACTURER="{usb_manufacturer}"')
+
+        return " ".join(flags)
+
+    def render_boards(self, profile):
+        with open(self.template_file, "r", encoding="utf-8") as f:
+            content = f.read()
+        return content.replace("{EXTRA_FLAGS}", self.build_extra_flags(profile))
+
+    def boards_state(self, arduino_path, profile):
+        try:
+            boards_path = self._find_boards_file(arduino_path)
+            if not boards_path:
+                return False, "boards.txt não encontrado"
+            expected = parse_boards_lines(self.render_boards(profile).splitlines())
+            current = parse_boards(boards_path)
+            if current == expected:
+                return True, "boards.txt já corresponde ao perfil"
+            key = "leonardo.build.extra_flags"
+            if current.get(key) != expected.get(key):
+                return False, f"extra_flags atual '{current.get(key)}'"
+            return False, "boards.txt difere do template"
+        except Exception as e:
+            return False, f"Erro ao comparar boards.txt: {e}"
+
+    def modify_boards_file(self, arduino_path, profile, backup=True, purge=True):
         try:
             boards_path = self._find_boards_file(arduino_path)
             if not boards_path:
@@ -61,29 +117,19 @@ class FileManager:
                 print(f" Template não encontrado: {self.template_file}")
                 return False
 
-            with open(self.template_file, "r", encoding="utf-8") as f:
-                content = f.read()
-
-            flags = []
-            if profile.get("force_vid_pid", False):
-                flags.append(f"-DUSB_VID={profile['vid']} -DUSB_PID={profile['pid']}")
-            if profile.get("force_product_manufacturer", False):
-                usb_product = profile.get("usb_product", profile.get("product", "Arduino Leonardo"))
-                usb_manufacturer = profile.get("usb_manufacturer", profile.get("manufacturer", "Arduino"))
-
-                flags.append(f'-DUSB_PRODUCT="{usb_product}"')
-                flags.append(f'-DUSB_MANUFACTURER="{usb_manufacturer}"')
-
-            extra_flags = " ".join(flags)
-
-            content = content.replace("{EXTRA_FLAGS}", extra_flags)
+            content = self.render_boards(profile)
 
-            self.backup_boards_file(arduino_path)
+            if backup:
+                self.backup_boards_file(arduino_path)
 
-            with open(boards_path, "w", encoding="utf-8") as f:
+            # Troca atômica: uma compilação em paralelo nunca lê o arquivo pela metade.
+            tmp_path = f"{boards_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
                 f.write(content)
+            os.replace(tmp_path, boards_path)
 
-            self._clean_arduino_cache()
+            if purge:
+                self._clean_arduino_cache()
             print(" boards.txt atualizado com sucesso (via template mínimo)")
             return True
         except Exception as e:
@@ -94,22 +140,7 @@ class FileManager:
 
     def _clean_arduino_cache(self):
         try:
-            cli_path = os.path.join("utils", "arduino-cli.exe")
-            if os.path.exists(cli_path):
-                subprocess.run([cli_path, "cache", "clean"], timeout=30)
-
-            temp_dirs = [
-                os.path.join(os.environ.get('TEMP', ''), 'arduino', 'sketches'),
-                os.path.join(os.environ.get('TEMP', ''), 'arduino', 'cores'),
-                os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Temp', 'arduino', 'sketches'),
-                os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Temp', 'arduino', 'cores')
-            ]
-
-            for temp_dir in temp_dirs:
-                if os.path.exists(temp_dir):
-                    shutil.rmtree(temp_dir, ignore_errors=True)
-                    print(f" Diretório temporário limpo: {temp_dir}")
-
+            self.cache_purger.purge(toolchain.temp_dirs(), cli_path=toolchain.cli_path())
         except Exception as e:
             print(f" Erro ao limpar cache: {e}")
 
@@ -129,72 +160,37 @@ class FileManager:
             return False, f"Erro na verificação: {str(e)}"
 
     def check_spoof_trace(self, arduino_path):
-        factory_block = {
-            "leonardo.name": "Arduino Leonardo",
-            "leonardo.vid.0": "0x2341",
-            "leonardo.pid.0": "0x0036",
-            "leonardo.vid.1": "0x2341",
-            "leonardo.pid.1": "0x8036",
-            "leonardo.vid.2": "0x2A03",
-            "leonardo.pid.2": "0x0036",
-            "leonardo.vid.3": "0x2A03",
-            "leonardo.pid.3": "0x8036",
-            "leonardo.upload_port.0.vid": "0x2341",
-            "leonardo.upload_port.0.pid": "0x0036",
-            "leonardo.upload_port.1.vid": "0x2341",
-            "leonardo.upload_port.1.pid": "0x8036",
-            "leonardo.upload_port.2.vid": "0x2A03",
-            "leonardo.upload_port.2.pid": "0x0036",
-            "leonardo.upload_port.3.vid": "0x2A03",
-            "leonardo.upload_port.3.pid": "0x8036",
-            "leonardo.upload_port.4.board": "leonardo",
-            "leonardo.upload.tool": "avrdude",
-            "leonardo.upload.tool.default": "avrdude",
-            "leonardo.upload.tool.network": "arduino_ota",
-            "leonardo.upload.protocol": "avr109",
-            "leonardo.upload.maximum_size": "28672",
-            "leonardo.upload.maximum_data_size": "2560",
-            "leonardo.upload.speed": "57600",
-            "leonardo.upload.disable_flushing": "true",
-            "leonardo.upload.use_1200bps_touch": "true",
-            "leonardo.upload.wait_for_upload_port": "true",
-            "leonardo.bootloader.tool": "avrdude",
-            "leonardo.bootloader.tool.default": "avrdude",
-            "leonardo.bootloader.low_fuses": "0xff",
-            "leonardo.bootloader.high_fuses": "0xd8",
-            "leonardo.bootloader.extended_fuses": "0xcb",
-            "leonardo.bootloader.file": "caterina/Caterina-Leonardo.hex",
-            "leonardo.bootloader.unlock_bits": "0x3F",
-            "leonardo.bootloader.lock_bits": "0x2F",
-            "leonardo.build.mcu": "atmega32u4",
-            "leonardo.build.f_cpu": "16000000L",
-            "leonardo.build.vid": "0x2341",
-            "leonardo.build.pid": "0x8036",
-            "leonardo.build.usb_product": "\"Arduino Leonardo\"",
-            "leonardo.build.board": "AVR_LEONARDO",
-            "leonardo.build.core": "arduino",
-            "leonardo.build.variant": "leonardo",
-            "leonardo.build.extra_flags": "{build.usb_flags}"
-        }
-
         boards_path = self._find_boards_file(arduino_path)
         if not boards_path or not os.path.exists(boards_path):
             return False, "boards.txt não encontrado"
+        return self._trace_verdict(boards_path)
+
+    def _trace_verdict(self, boards_path):
+        baseline = BoardsBaseline.load(self.default_template_file)
+        key = (os.path.abspath(boards_path), stat_signature(boards_path), baseline.signature)
+        with self._verdict_lock:
+            cached = self._verdict_cache.get(key[0])
+            if cached and cached[0] == key:
+                return cached[1]
+
+        verdict = baseline.check(boards_path)
+        with self._verdict_lock:
+            self._verdict_cache[key[0]] = (key, verdict)
+        return verdict
+
+    def watch_boards_file(self, arduino_path, on_change):
+        boards_path = self._find_boards_file(arduino_path)
+        if not boards_path:
+            return None
 
-        with open(boards_path, "r", encoding="utf-8") as f:
-            lines = [line.strip() for line in f if line.strip().startswith("leonardo.")]
-
-        for line in lines:
-            if "=" not in line:
-                continue
-            key, value = line.split("=", 1)
-            key, value = key.strip(), value.strip()
-            if key not in factory_block:
-                return True, f" Rastro detectado: chave extra '{key}'"
-            if key == "leonardo.build.extra_flags":
-                if value != "{build.usb_flags}":
-                    return True, f" Rastro detectado: extra_flags adulterado  {value}"
-            elif value != factory_block[key]:
-                return True, f" Rastro detectado: {key} esperado '{factory_block[key]}', encontrado '{value}'"
-
-        return False, " boards.txt está no padrão original"
\ No newline at end of file
+        def _changed(path):
+            try:
+                on_change(path, *self._trace_verdict(path))
+            except Exception as e:
+                print(f" Erro ao reavaliar boards.txt: {e}")
+
+        if self._boards_watcher:
+            self._boards_watcher.stop()
+        self._boards_watcher = FileWatcher(_changed)
+        self._boards_watcher.watch(boards_path)
+        return boards_path
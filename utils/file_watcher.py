@@ -0,0 +1,73 @@
+import os
+import threading
+
+
+def stat_signature(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+    except OSError:
+        return None
+
+
+class FileWatcher:
+    def __init__(self, callback, interval=1.0, debounce=0.3):
+        self.callback = callback
+        self.interval = interval
+        self.debounce = debounce
+        self._paths = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def watch(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            self._paths[path] = stat_signature(path)
+        self.start()
+
+    def unwatch(self, path):
+        with self._lock:
+            self._paths.pop(os.path.abspath(path), None)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="FileWatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                snapshot = dict(self._paths)
+
+            for path, known in snapshot.items():
+                current = stat_signature(path)
+                if current == known:
+                    continue
+
+                # Editores e o instalador de cores gravam em etapas; só notifica
+                # quando o arquivo para de mudar.
+                while not self._stop.wait(self.debounce):
+                    settled = stat_signature(path)
+                    if settled == current:
+                        break
+                    current = settled
+
+                # stop() durante a espera descarta a notificação pendente.
+                if self._stop.is_set():
+                    return
+                with self._lock:
+                    if path not in self._paths:
+                        continue
+                    self._paths[path] = current
+                if self._stop.is_set():
+                    return
+                try:
+                    self.callback(path)
+                except Exception as e:
+                    print(f"[FileWatcher] Erro ao processar {path}: {e}")
@@ -0,0 +1,216 @@
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+
+LATENCY_VERSION = 1
+
+# métrica: (prazo sem histórico suficiente, mínimo, máximo) em segundos
+LATENCY_BOUNDS = {
+    "rtt": (2.5, 0.2, 7.5),
+    "banner": (1.5, 0.3, 4.0),
+    "bootloader": (4.0, 1.0, 8.0),
+    "reenum": (30.0, 3.0, 60.0),
+    "tool": (5.0, 1.0, 15.0)
+}
+WINDOW = 50
+MIN_SAMPLES = 5
+MARGIN = 1.5
+PAD = 0.05
+# Prazo estourado sem resposta: a latência real é maior que o prazo (amostra
+# censurada). Cada estouro seguido dobra o prazo, até o máximo da métrica.
+BACKOFF = 2
+MAX_MISSES = 4
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+# Comandos diferentes têm latências diferentes (STATUS responde na hora, SAVE
+# grava a EEPROM): cada um tem a sua janela, "rtt:SAVE".
+def metric_key(metric, command=None):
+    return f"{metric}:{command.upper()}" if command else metric
+
+
+class LatencyModel:
+    def __init__(self, path="latency.json", debounce=2.0):
+        self.path = path
+        self.debounce = debounce
+        self._ports = None
+        self._misses = None
+        self._dirty = False
+        self._timer = None
+        self._lock = threading.RLock()
+
+    def _ensure_loaded(self):
+        if self._ports is not None:
+            return
+        self._ports = {}
+        self._misses = {}
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+                if saved.get("version") == LATENCY_VERSION:
+                    self._ports = saved.get("ports", {})
+                    self._misses = saved.get("misses", {})
+        except Exception as e:
+            print(f"[LatencyModel] Erro ao ler {self.path}: {e}")
+
+    def samples(self, port, metric, command=None):
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._ports.get(port, {}).get(metric_key(metric, command), []))
+
+    def misses(self, port, metric, command=None):
+        with self._lock:
+            self._ensure_loaded()
+            return self._misses.get(port, {}).get(metric_key(metric, command), 0)
+
+    def observe(self, port, metric, seconds, command=None):
+        if metric not in LATENCY_BOUNDS or not port:
+            return
+        key = metric_key(metric, command)
+        with self._lock:
+            self._ensure_loaded()
+            window = self._ports.setdefault(port, {}).setdefault(key, [])
+            window.append(round(seconds, 4))
+            del window[:-WINDOW]
+            self._misses.get(port, {}).pop(key, None)
+            self._dirty = True
+            self._schedule_save()
+
+    def timed_out(self, port, metric, command=None):
+        if metric not in LATENCY_BOUNDS or not port:
+            return
+        key = metric_key(metric, command)
+        with self._lock:
+            self._ensure_loaded()
+            misses = self._misses.setdefault(port, {})
+            misses[key] = min(misses.get(key, 0) + 1, MAX_MISSES)
+            self._dirty = True
+            self._schedule_save()
+
+    # p95 da janela recente com margem, limitado aos extremos da métrica; sem
+    # amostras suficientes vale o prazo conservador (o antigo valor fixo). Um
+    # timeout explícito do chamador é piso: o aprendido só pode alongá-lo.
+    def deadline(self, port, metric, default=None, command=None, minimum=None):
+        fallback, low, high = LATENCY_BOUNDS[metric]
+        if default is not None:
+            fallback = default
+        high = max(high, fallback)
+        window = self.samples(port, metric, command)
+        if len(window) < MIN_SAMPLES:
+            value = fallback
+        else:
+            value = clamp(percentile(window, 95) * MARGIN + PAD, low, high)
+        misses = self.misses(port, metric, command)
+        if misses:
+            value = min(value * BACKOFF ** misses, high)
+        if minimum is not None:
+            value = max(value, minimum)
+        return value
+
+    def poll_interval(self, port, metric, default=0.1, command=None):
+        window = self.samples(port, metric, command)
+        if len(window) < MIN_SAMPLES:
+            return default
+        return clamp(percentile(window, 50) / 20, 0.05, 0.5)
+
+    def stats(self):
+        with self._lock:
+            self._ensure_loaded()
+            ports = {port: {k: list(w) for k, w in metrics.items()} for port, metrics in self._ports.items()}
+            for port, metrics in self._misses.items():
+                for key in metrics:
+                    ports.setdefault(port, {}).setdefault(key, [])
+        result = {}
+        for port, metrics in ports.items():
+            for key, window in metrics.items():
+                metric, _, command = key.partition(":")
+                if metric not in LATENCY_BOUNDS:
+                    continue
+                misses = self.misses(port, metric, command or None)
+                if not window and not misses:
+                    continue
+                result.setdefault(port, {})[key] = {
+                    "count": len(window),
+                    "misses": misses,
+                    "p50": percentile(window, 50) if window else None,
+                    "p95": percentile(window, 95) if window else None,
+                    "max": max(window) if window else None,
+                    "deadline": self.deadline(port, metric, command=command or None)
+                }
+        return result
+
+    def _cancel_timer(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def _schedule_save(self):
+        self._cancel_timer()
+        self._timer = threading.Timer(self.debounce, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            self._cancel_timer()
+            if not self._dirty or self._ports is None:
+                return False
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix=".latency.", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"version": LATENCY_VERSION, "ports": self._ports, "misses": self._misses}, f,
+                              indent=2)
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+                return True
+            except Exception as e:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                print(f"[LatencyModel] Erro ao salvar {self.path}: {e}")
+                return False
+
+
+latency = LatencyModel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.latency_model",
+        description="Mostra as latências observadas por porta e os prazos derivados."
+    )
+    parser.add_argument("--path", default="latency.json")
+    args = parser.parse_args(argv)
+
+    stats = LatencyModel(args.path).stats()
+    if not stats:
+        print(f"Nenhuma latência registrada em {args.path}")
+        return 0
+    def _fmt(value):
+        return f"{value:>8.3f}" if value is not None else f"{'-':>8}"
+
+    print(f"{'porta':<16} {'métrica':<16} {'n':>3} {'estouros':>8} {'p50':>8} {'p95':>8} {'máx':>8} {'prazo':>8}")
+    for port in sorted(stats):
+        for key in sorted(stats[port]):
+            s = stats[port][key]
+            print(f"{port:<16} {key:<16} {s['count']:>3} {s['misses']:>8} {_fmt(s['p50'])} {_fmt(s['p95'])} "
+                  f"{_fmt(s['max'])} {_fmt(s['deadline'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
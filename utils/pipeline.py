@@ -0,0 +1,152 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class PipelineAbort(Exception):
+    def __init__(self, result, message=""):
+        super().__init__(message)
+        self.result = result
+
+
+class Stage:
+    def __init__(self, name, fn, inputs=(), outputs=()):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+
+    # Uma saída: o valor retornado; várias: uma tupla na ordem declarada.
+    def unpack(self, value):
+        if not self.outputs:
+            return {}
+        if len(self.outputs) == 1:
+            return {self.outputs[0]: value}
+        if not isinstance(value, tuple) or len(value) != len(self.outputs):
+            raise ValueError(f"Etapa '{self.name}' deve retornar {len(self.outputs)} valores")
+        return dict(zip(self.outputs, value))
+
+
+class PipelineRun:
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.values = {}
+        self.timings = {}
+        self.aborted = None
+        self.error = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def result(self):
+        return self.aborted.result if self.aborted else None
+
+    def critical_path(self):
+        if not self.timings:
+            return []
+        name = max(self.timings, key=lambda n: self.timings[n][1])
+        path = [name]
+        while True:
+            deps = [d for d in self.pipeline.deps[name] if d in self.timings]
+            if not deps:
+                break
+            name = max(deps, key=lambda n: self.timings[n][1])
+            path.append(name)
+        return path[::-1]
+
+    def summary(self):
+        path = self.critical_path()
+        if not path:
+            return "nenhuma etapa executada"
+        total = self.timings[path[-1]][1]
+        busy = sum(end - start for start, end in self.timings.values())
+        steps = " → ".join(f"{n} {self.timings[n][1] - self.timings[n][0]:.2f}s" for n in path)
+        return f"{steps} (total {total:.2f}s, soma das etapas {busy:.2f}s)"
+
+
+class Pipeline:
+    def __init__(self, stages, max_workers=4):
+        self.stages = {}
+        producers = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Etapa duplicada: {stage.name}")
+            self.stages[stage.name] = stage
+            for output in stage.outputs:
+                if output in producers:
+                    raise ValueError(f"Saída '{output}' produzida por '{producers[output]}' e '{stage.name}'")
+                producers[output] = stage.name
+
+        self.deps = {}
+        for stage in stages:
+            missing = [i for i in stage.inputs if i not in producers]
+            if missing:
+                raise ValueError(f"Etapa '{stage.name}' depende de entradas sem origem: {missing}")
+            self.deps[stage.name] = {producers[i] for i in stage.inputs}
+        self.order = self._topological_order()
+        self.max_workers = max_workers
+
+    def _topological_order(self):
+        remaining = {name: set(deps) for name, deps in self.deps.items()}
+        order = []
+        while remaining:
+            ready = sorted(name for name, deps in remaining.items() if not deps)
+            if not ready:
+                raise ValueError(f"Ciclo entre as etapas: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+                order.append(name)
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return order
+
+    def _call(self, run, stage, values, started):
+        run.timings[stage.name] = (time.monotonic() - started, None)
+        try:
+            return stage.unpack(stage.fn(**{i: values[i] for i in stage.inputs}))
+        finally:
+            run.timings[stage.name] = (run.timings[stage.name][0], time.monotonic() - started)
+
+    # Cada etapa começa assim que suas entradas existem. PipelineAbort encerra
+    # a execução com um resultado: etapas em andamento terminam (e podem olhar
+    # run.cancel_event), as que ainda não começaram são descartadas.
+    def run(self, cancel_event=None):
+        run = PipelineRun(self)
+        if cancel_event is not None:
+            run.cancel_event = cancel_event
+        started = time.monotonic()
+        waiting = {name: set(deps) for name, deps in self.deps.items()}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline") as pool:
+            futures = {}
+
+            def _submit_ready():
+                for name in [n for n in self.order if n in waiting and not waiting[n]]:
+                    del waiting[name]
+                    values = dict(run.values)
+                    futures[pool.submit(self._call, run, self.stages[name], values, started)] = name
+
+            _submit_ready()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = futures.pop(future)
+                    try:
+                        run.values.update(future.result())
+                    except PipelineAbort as e:
+                        if run.aborted is None and run.error is None:
+                            run.aborted = e
+                        run.cancel_event.set()
+                        continue
+                    except Exception as e:
+                        if run.error is None:
+                            run.error = e
+                        run.cancel_event.set()
+                        continue
+                    for deps in waiting.values():
+                        deps.discard(name)
+                if not run.cancel_event.is_set():
+                    _submit_ready()
+
+        if run.error is not None:
+            raise run.error
+        return run
@@ -0,0 +1,194 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+from utils.arduino_utils import ArduinoUtils, FQBN
+from utils.scheduler import PRIORITY_BACKGROUND, build_resource
+
+
+def sketch_signature(sketch_path):
+    digest = hashlib.sha1()
+    for root, _, files in os.walk(sketch_path):
+        for name in sorted(files):
+            st = os.stat(os.path.join(root, name))
+            digest.update(f"{name}:{st.st_mtime_ns}:{st.st_size};".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class PrebuildJob:
+    def __init__(self, key, build_path):
+        self.key = key
+        self.build_path = build_path
+        self.cancel_event = threading.Event()
+        self.future = None
+        self.ok = None
+        self.message = ""
+
+
+class Prebuilder:
+    def __init__(self, scheduler, mode="universal", debounce=0.8, on_event=None, max_builds=6):
+        self.scheduler = scheduler
+        self.mode = mode
+        self.debounce = debounce
+        self.on_event = on_event
+        self.max_builds = max_builds
+        self.build_root = os.path.join(tempfile.gettempdir(), "arduino-spoofer-builds")
+        self._lock = threading.Lock()
+        self._timer = None
+        self._current = None
+        self._sizes = {}
+        self._in_use = set()
+        scheduler.submit("prune builds", self.prune, priority=PRIORITY_BACKGROUND)
+
+    # Mantém só os diretórios usados mais recentemente (mtime atualizado a cada
+    # compilação); os que estão compilando agora nunca são apagados.
+    def prune(self):
+        try:
+            paths = [os.path.join(self.build_root, n) for n in os.listdir(self.build_root)]
+        except OSError:
+            return 0
+        paths = [p for p in paths if os.path.isdir(p)]
+        paths.sort(key=lambda p: os.stat(p).st_mtime, reverse=True)
+        with self._lock:
+            protected = set(self._in_use)
+            if self._current:
+                protected.add(self._current.build_path)
+        removed = 0
+        for path in paths[self.max_builds:]:
+            if path not in protected:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def build_key(self, extra_flags):
+        sketch_path = ArduinoUtils.get_sketch_path(self.mode)
+        material = f"{FQBN}|{self.mode}|{extra_flags}|{sketch_signature(sketch_path)}"
+        return hashlib.sha1(material.encode("utf-8")).hexdigest()
+
+    def request(self, extra_flags, resources=()):
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self._start, args=(extra_flags, tuple(resources)))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def cancel(self):
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            self._cancel_current()
+
+    def _cancel_current(self):
+        job = self._current
+        self._current = None
+        if job and job.ok is None:
+            job.cancel_event.set()
+            if job.future:
+                job.future.cancel()
+
+    def _start(self, extra_flags, resources):
+        try:
+            key = self.build_key(extra_flags)
+        except OSError as e:
+            self._notify(f"Pré-compilação ignorada: {e}")
+            return
+
+        with self._lock:
+            self._timer = None
+            if self._current and self._current.key == key and self._current.ok is not False:
+                return
+            self._cancel_current()
+
+            job = PrebuildJob(key, os.path.join(self.build_root, key[:16]))
+            self._current = job
+            job.future = self.scheduler.submit(
+                f"prebuild {key[:8]}", self._build, job, extra_flags,
+                resources=list(resources) + [build_resource(job.build_path)],
+                priority=PRIORITY_BACKGROUND
+            )
+
+    def _compile(self, key, build_path, extra_flags, cancel_event, low_priority):
+        os.makedirs(build_path, exist_ok=True)
+        os.utime(build_path)
+        with self._lock:
+            self._in_use.add(build_path)
+        try:
+            ok, out, err = ArduinoUtils.compile_sketch(
+                self.mode,
+                build_path=build_path,
+                build_properties=[f"build.extra_flags={{build.usb_flags}} {extra_flags}".rstrip()],
+                cancel_event=cancel_event,
+                low_priority=low_priority
+            )
+        finally:
+            with self._lock:
+                self._in_use.discard(build_path)
+        self.prune()
+        # Também na falha: um sketch grande demais imprime o tamanho e só então
+        # o erro, e é justamente o caso em que o aviso importa.
+        report = ArduinoUtils.parse_size_report(f"{out or ''}\n{err or ''}")
+        if report:
+            with self._lock:
+                self._sizes[key] = report
+        return ok, out, err
+
+    def size_report(self, extra_flags):
+        key = self.build_key(extra_flags)
+        with self._lock:
+            return self._sizes.get(key)
+
+    # Compilação imediata, na prioridade normal, para quando não há pré-compilação.
+    def build(self, extra_flags, cancel_event=None):
+        key = self.build_key(extra_flags)
+        build_path = os.path.join(self.build_root, key[:16])
+        ok, out, err = self._compile(key, build_path, extra_flags, cancel_event, low_priority=False)
+        return ok, build_path, err or out
+
+    def _build(self, job, extra_flags):
+        if job.cancel_event.is_set():
+            return False
+        ok, out, err = self._compile(job.key, job.build_path, extra_flags, job.cancel_event, low_priority=True)
+        job.ok = ok
+        job.message = err or out
+        if job.cancel_event.is_set() and not ok:
+            return ok
+        if ok:
+            self._notify(f"Pré-compilação pronta ({job.key[:8]})")
+        else:
+            self._notify(f"Pré-compilação falhou: {job.message.strip()[:200]}")
+        with self._lock:
+            report = self._sizes.get(job.key) or {}
+        for warning in ArduinoUtils.size_warnings(report):
+            self._notify(f" Aviso de tamanho: {warning}")
+        return ok
+
+    def _notify(self, message):
+        if self.on_event:
+            self.on_event(message)
+
+    def settle(self, extra_flags):
+        key = self.build_key(extra_flags)
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            if self._current and self._current.key != key:
+                self._cancel_current()
+
+    # Chamado de dentro do job de gravação, que já detém os mesmos recursos da
+    # pré-compilação: se ela ainda não rodou, não vai rodar antes dele.
+    def take(self, extra_flags):
+        key = self.build_key(extra_flags)
+        with self._lock:
+            job = self._current
+            if not job or job.key != key:
+                return None
+            if job.future and job.future.done() and job.ok:
+                os.utime(job.build_path)
+                return job.build_path
+            self._cancel_current()
+            return None
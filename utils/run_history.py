@@ -0,0 +1,372 @@
+import argparse
+import os
+import platform
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+from utils.latency_model import percentile
+from utils.toolchain import toolchain
+
+HISTORY_VERSION = 1
+BREAKDOWN_FIELDS = ("station", "location", "port", "profile", "outcome", "cli_version", "core_version")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL,
+    kind TEXT NOT NULL,
+    port TEXT,
+    location TEXT,
+    profile TEXT,
+    station TEXT,
+    ok INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    message TEXT,
+    outcome TEXT,
+    cli_version TEXT,
+    core_version TEXT
+);
+CREATE TABLE IF NOT EXISTS stages (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    start REAL NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    sketch TEXT NOT NULL,
+    profile TEXT,
+    build_key TEXT,
+    extra_flags TEXT,
+    flash INTEGER,
+    flash_max INTEGER,
+    ram INTEGER,
+    ram_max INTEGER,
+    UNIQUE (build_key, profile)
+);
+CREATE INDEX IF NOT EXISTS runs_started ON runs(started);
+CREATE INDEX IF NOT EXISTS builds_sketch ON builds(sketch, id);
+CREATE INDEX IF NOT EXISTS stages_run ON stages(run_id);
+CREATE INDEX IF NOT EXISTS stages_name ON stages(name);
+"""
+
+
+class OperationRecord:
+    def __init__(self, history, kind, port=None, profile=None, arduino_path=None):
+        self.history = history
+        self.kind = kind
+        self.port = port
+        self.profile = profile
+        self.arduino_path = arduino_path
+        self.location = None
+        # Resultado que não é etapa (ex. o nível em que a verificação confirmou).
+        self.outcome = None
+        self.started = time.time()
+        self._t0 = time.monotonic()
+        self.stages = []
+
+    def stage(self, name, start, duration):
+        self.stages.append((name, start, duration))
+
+    def add_pipeline(self, run):
+        for name, (start, end) in sorted(run.timings.items(), key=lambda item: item[1][0]):
+            if end is not None:
+                self.stage(name, start, end - start)
+
+    # Resultados (ok, ...) dizem o próprio status; respostas "ERRO: ..." do
+    # serial_tool e exceções contam como falha.
+    def finish_future(self, future):
+        error = future.exception()
+        if error is not None:
+            self.finish(False, str(error))
+            return
+        result = future.result()
+        if isinstance(result, tuple) and result and isinstance(result[0], bool):
+            self.finish(result[0], " ".join(str(r) for r in result[1:] if r))
+        elif isinstance(result, str):
+            self.finish(not result.startswith("ERRO"), result)
+        else:
+            self.finish(True)
+
+    def finish(self, ok, message=""):
+        duration = time.monotonic() - self._t0
+        try:
+            self.history.record(self, ok, duration, message)
+        except Exception as e:
+            print(f"[RunHistory] Erro ao registrar {self.kind}: {e}")
+
+
+def _where(kind=None, days=None, prefix=""):
+    clauses, params = [], []
+    if kind:
+        clauses.append(f"{prefix}kind = ?")
+        params.append(kind)
+    if days:
+        clauses.append(f"{prefix}started >= ?")
+        params.append(time.time() - days * 86400)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _row_dict(keys, row):
+    return dict(zip(keys, row)) if row else None
+
+
+def _summary(durations):
+    return {
+        "count": len(durations),
+        "p50": percentile(durations, 50),
+        "p95": percentile(durations, 95),
+        "max": max(durations)
+    }
+
+
+class RunHistory:
+    def __init__(self, path="run_history.db", max_runs=5000, max_age_days=180, max_builds=500):
+        self.path = path
+        self.max_runs = max_runs
+        self.max_builds = max_builds
+        self.max_age_days = max_age_days
+        self.station = platform.node() or None
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.execute("PRAGMA journal_mode = WAL")
+            if conn.execute("PRAGMA user_version").fetchone()[0] != HISTORY_VERSION:
+                conn.executescript(SCHEMA)
+                conn.execute(f"PRAGMA user_version = {HISTORY_VERSION}")
+                conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def begin(self, kind, port=None, profile=None, arduino_path=None):
+        return OperationRecord(self, kind, port, profile, arduino_path)
+
+    def _tool_versions(self, arduino_path):
+        try:
+            cli_version = toolchain.cli_version()
+            core_version = toolchain.avr_core_version(arduino_path) if arduino_path else None
+        except Exception:
+            return None, None
+        return cli_version, core_version
+
+    def record(self, op, ok, duration, message=""):
+        cli_version, core_version = self._tool_versions(op.arduino_path)
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                cur = conn.execute(
+                    "INSERT INTO runs (started, kind, port, location, profile, station, ok, duration,"
+                    " message, outcome, cli_version, core_version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (op.started, op.kind, op.port, op.location, op.profile, self.station, int(bool(ok)),
+                     duration, (message or "")[:500], op.outcome, cli_version, core_version)
+                )
+                conn.executemany(
+                    "INSERT INTO stages (run_id, name, start, duration) VALUES (?, ?, ?, ?)",
+                    [(cur.lastrowid, name, start, dur) for name, start, dur in op.stages]
+                )
+                self._prune(conn)
+            return cur.lastrowid
+
+    def _prune(self, conn):
+        cutoff = time.time() - self.max_age_days * 86400
+        conn.execute("DELETE FROM runs WHERE started < ?", (cutoff,))
+        conn.execute(
+            "DELETE FROM runs WHERE id <= (SELECT id FROM runs ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            (self.max_runs,)
+        )
+        self._prune_builds(conn)
+
+    def _prune_builds(self, conn):
+        conn.execute("DELETE FROM builds WHERE created < ?", (time.time() - self.max_age_days * 86400,))
+        conn.execute(
+            "DELETE FROM builds WHERE id <= (SELECT id FROM builds ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            (self.max_builds,)
+        )
+
+    # Cada build entra uma vez por perfil (sem VID/PID nem nomes forçados,
+    # perfis diferentes compilam o mesmo binário e dividem a chave); a
+    # comparação é com o build anterior do mesmo perfil (mudança de firmware)
+    # e com o último build do sketch (mudança de perfil, ex. nomes mais longos).
+    def record_build(self, sketch, profile, build_key, extra_flags, report):
+        keys = ("id", "created", "sketch", "profile", "build_key", "flash", "flash_max", "ram", "ram_max")
+        columns = ", ".join(keys)
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                row = conn.execute(f"SELECT {columns} FROM builds WHERE build_key = ? AND profile IS ?",
+                                   (build_key, profile)).fetchone()
+                new = row is None
+                if new:
+                    cur = conn.execute(
+                        "INSERT INTO builds (created, sketch, profile, build_key, extra_flags, flash, flash_max,"
+                        " ram, ram_max) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (time.time(), sketch, profile, build_key, extra_flags, report.get("flash"),
+                         report.get("flash_max"), report.get("ram"), report.get("ram_max"))
+                    )
+                    build_id = cur.lastrowid
+                    self._prune_builds(conn)
+                else:
+                    build_id = row[0]
+                same_profile = conn.execute(
+                    f"SELECT {columns} FROM builds WHERE sketch = ? AND profile IS ? AND id < ?"
+                    " ORDER BY id DESC LIMIT 1", (sketch, profile, build_id)).fetchone()
+                latest = conn.execute(
+                    f"SELECT {columns} FROM builds WHERE sketch = ? AND id < ? ORDER BY id DESC LIMIT 1",
+                    (sketch, build_id)).fetchone()
+        return new, _row_dict(keys, same_profile), _row_dict(keys, latest)
+
+    def builds(self, sketch=None, limit=10):
+        where, params = (" WHERE sketch = ?", [sketch]) if sketch else ("", [])
+        keys = ("id", "created", "sketch", "profile", "flash", "flash_max", "ram", "ram_max")
+        rows = self._query(
+            f"SELECT {', '.join(keys)} FROM builds{where} ORDER BY id DESC LIMIT ?", params + [limit])
+        return [dict(zip(keys, row)) for row in rows]
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._connection().execute(sql, params).fetchall()
+
+    # Duração total de cada operação aparece como a etapa "total".
+    def stage_stats(self, kind=None, days=None):
+        where, params = _where(kind, days, "r.")
+        groups = {}
+        for kind_, name, duration in self._query(
+                f"SELECT r.kind, s.name, s.duration FROM stages s JOIN runs r ON r.id = s.run_id{where}", params):
+            groups.setdefault((kind_, name), []).append(duration)
+        where, params = _where(kind, days)
+        for kind_, duration in self._query(f"SELECT kind, duration FROM runs{where}", params):
+            groups.setdefault((kind_, "total"), []).append(duration)
+        return [dict(kind=k, stage=s, **_summary(d)) for (k, s), d in sorted(groups.items())]
+
+    def trend(self, kind=None, days=30):
+        where, params = _where(kind, days)
+        days_ = {}
+        for started, duration, ok in self._query(f"SELECT started, duration, ok FROM runs{where}", params):
+            day = datetime.fromtimestamp(started).strftime("%Y-%m-%d")
+            days_.setdefault(day, []).append((duration, ok))
+        result = []
+        for day in sorted(days_):
+            runs = days_[day]
+            entry = _summary([d for d, _ in runs])
+            entry.update(day=day, failures=sum(1 for _, ok in runs if not ok))
+            result.append(entry)
+        return result
+
+    def breakdown(self, field, kind=None, days=None):
+        if field not in BREAKDOWN_FIELDS:
+            raise ValueError(f"Campo inválido: {field} (use {', '.join(BREAKDOWN_FIELDS)})")
+        where, params = _where(kind, days)
+        groups = {}
+        for value, duration, ok in self._query(f"SELECT {field}, duration, ok FROM runs{where}", params):
+            groups.setdefault(value or "-", []).append((duration, ok))
+        result = []
+        for value in sorted(groups):
+            runs = groups[value]
+            entry = _summary([d for d, _ in runs])
+            entry.update(value=value, failures=sum(1 for _, ok in runs if not ok))
+            result.append(entry)
+        return result
+
+    def slowest(self, limit=10, kind=None, days=None):
+        where, params = _where(kind, days)
+        rows = self._query(
+            f"SELECT id, started, kind, port, profile, outcome, ok, duration, message FROM runs{where}"
+            " ORDER BY duration DESC LIMIT ?", params + [limit]
+        )
+        keys = ("id", "started", "kind", "port", "profile", "outcome", "ok", "duration", "message")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def format_size(report):
+    parts = []
+    for name, label in (("flash", "flash"), ("ram", "RAM")):
+        used, maximum = report.get(name), report.get(f"{name}_max")
+        if used is None:
+            continue
+        parts.append(f"{used}/{maximum} B {label} ({used / maximum:.1%})" if maximum else f"{used} B {label}")
+    return ", ".join(parts) or "tamanho desconhecido"
+
+
+def format_size_delta(report, previous):
+    parts = []
+    for name, label in (("flash", "flash"), ("ram", "RAM")):
+        if report.get(name) is not None and previous.get(name) is not None:
+            parts.append(f"{report[name] - previous[name]:+d} B {label}")
+    return ", ".join(parts)
+
+
+def format_report(history, kind=None, days=30, limit=10, by=None):
+    lines = [f"Etapas (últimos {days} dias)" if days else "Etapas"]
+    lines.append(f"{'operação':<12} {'etapa':<14} {'n':>5} {'p50':>8} {'p95':>8} {'máx':>8}")
+    for s in history.stage_stats(kind, days):
+        lines.append(f"{s['kind']:<12} {s['stage']:<14} {s['count']:>5} {s['p50']:>8.2f} "
+                     f"{s['p95']:>8.2f} {s['max']:>8.2f}")
+
+    lines += ["", "Tendência diária (duração total)"]
+    lines.append(f"{'dia':<12} {'n':>5} {'falhas':>6} {'p50':>8} {'p95':>8}")
+    for t in history.trend(kind, days):
+        lines.append(f"{t['day']:<12} {t['count']:>5} {t['failures']:>6} {t['p50']:>8.2f} {t['p95']:>8.2f}")
+
+    if by:
+        lines += ["", f"Por {by}"]
+        for b in history.breakdown(by, kind, days):
+            lines.append(f"{str(b['value'])[:28]:<28} {b['count']:>5} {b['failures']:>6} "
+                         f"{b['p50']:>8.2f} {b['p95']:>8.2f}")
+
+    builds = history.builds(limit=limit)
+    if builds:
+        lines += ["", "Tamanho do firmware (builds recentes)"]
+        for i, b in enumerate(builds):
+            when = datetime.fromtimestamp(b["created"]).strftime("%Y-%m-%d %H:%M")
+            previous = next((p for p in builds[i + 1:] if p["sketch"] == b["sketch"]), None)
+            delta = f" [{format_size_delta(b, previous)}]" if previous else ""
+            lines.append(f"{when} {b['sketch']:<18} {b['profile'] or '-':<24} {format_size(b)}{delta}")
+
+    lines += ["", f"{limit} execuções mais lentas"]
+    for r in history.slowest(limit, kind, days):
+        when = datetime.fromtimestamp(r["started"]).strftime("%Y-%m-%d %H:%M:%S")
+        status = "ok" if r["ok"] else "FALHA"
+        lines.append(f"{when} {r['kind']:<12} {r['port'] or '-':<14} {r['duration']:>8.2f}s {status:<5} "
+                     f"{r['profile'] or r['outcome'] or ''}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.run_history",
+        description="Relatório do histórico de operações (p50/p95 por etapa, tendência e mais lentas)."
+    )
+    parser.add_argument("--db", default="run_history.db")
+    parser.add_argument("--kind", help="filtrar por operação (spoof, verify, status...)")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--by", choices=BREAKDOWN_FIELDS, help="agrupar a duração total por campo")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"Histórico não encontrado: {args.db}")
+        return 1
+    history = RunHistory(args.db)
+    try:
+        print(format_report(history, args.kind, args.days, args.limit, args.by))
+    finally:
+        history.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import itertools
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+def port_resource(port):
+    return f"port:{port}"
+
+
+def boards_resource(boards_path):
+    return f"boards:{os.path.normcase(os.path.abspath(boards_path))}"
+
+
+def build_resource(build_path):
+    return f"build:{os.path.normcase(os.path.abspath(build_path))}"
+
+
+PRIORITY_NORMAL = 0
+PRIORITY_BACKGROUND = 10
+
+
+class Job:
+    def __init__(self, name, fn, args, kwargs, resources, priority, seq):
+        self.name = name
+        self.priority = priority
+        self.seq = seq
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.resources = frozenset(r for r in resources if r)
+        self.future = Future()
+
+
+class OperationScheduler:
+    def __init__(self, max_workers=3):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="op")
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        self._pending = []
+        self._busy = set()
+        self._running = 0
+        self._seq = itertools.count()
+
+    def submit(self, name, fn, *args, resources=(), priority=PRIORITY_NORMAL, **kwargs):
+        with self._lock:
+            job = Job(name, fn, args, kwargs, resources, priority, next(self._seq))
+            self._pending.append(job)
+            self._pending.sort(key=lambda j: (j.priority, j.seq))
+        self._dispatch()
+        return job.future
+
+    def is_busy(self, resource):
+        with self._lock:
+            return resource in self._busy or any(resource in job.resources for job in self._pending)
+
+    def pending_jobs(self):
+        with self._lock:
+            return [job.name for job in self._pending]
+
+    def _dispatch(self):
+        ready = []
+        with self._lock:
+            # Ordem de chegada por recurso: um job só passa na frente de outro
+            # mais antigo se não disputar nenhum recurso com ele. Jobs de fundo
+            # nunca ocupam o último worker livre.
+            blocked = set(self._busy)
+            for job in list(self._pending):
+                if self._running + len(ready) >= self._max_workers:
+                    break
+                if job.future.cancelled():
+                    self._pending.remove(job)
+                    continue
+                background_full = (job.priority > PRIORITY_NORMAL and
+                                   self._running + len(ready) >= self._max_workers - 1)
+                if background_full or job.resources & blocked:
+                    blocked |= job.resources
+                    continue
+                self._pending.remove(job)
+                self._busy |= job.resources
+                blocked |= job.resources
+                ready.append(job)
+            self._running += len(ready)
+
+        for job in ready:
+            self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        try:
+            if job.future.set_running_or_notify_cancel():
+                try:
+                    job.future.set_result(job.fn(*job.args, **job.kwargs))
+                except BaseException as e:
+                    job.future.set_exception(e)
+        finally:
+            with self._lock:
+                self._busy -= job.resources
+                self._running -= 1
+            self._dispatch()
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            for job in self._pending:
+                job.future.cancel()
+            self._pending.clear()
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,255 @@
+import atexit
+import os
+import re
+import struct
+import threading
+import time
+from datetime import datetime
+
+import serial
+
+CAPTURE_MAGIC = b"SPCAP2\0\0"
+CAPTURE_EXT = ".spcap"
+# magic, início (epoch em segundos), tamanho do nome da porta
+HEADER = struct.Struct("<8sdH")
+# tipo, delta em µs desde o evento anterior, tamanho dos dados
+EVENT = struct.Struct("<cIH")
+
+# O: host abriu a porta (dados: baudrate)   C: host fechou a porta
+# W: host -> placa                          R: placa -> host, marcado na chegada
+# D: bytes já registrados como R e descartados pelo host (reset_input_buffer)
+# G: porta sumiu (reset/reenumeração)       A: porta reapareceu (dados: novo nome)
+EVENT_TYPES = (b"O", b"C", b"W", b"R", b"D", b"G", b"A")
+DATA_EVENTS = (b"W", b"R", b"D")
+
+READ_SLICE = 0.01
+
+_capture_dir = None
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def set_capture_dir(path):
+    global _capture_dir
+    _capture_dir = path
+
+
+def capture_dir():
+    return _capture_dir or os.environ.get("SPOOFER_CAPTURE_DIR") or None
+
+
+def capture_path(directory, port):
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", os.path.basename(port)) or "port"
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    return os.path.join(directory, f"{name}-{stamp}{CAPTURE_EXT}")
+
+
+# Um arquivo por dispositivo e por execução: guarda as sessões seguidas e o
+# que acontece entre elas (reset, reenumeração com outro nome de porta).
+class CaptureJournal:
+    def __init__(self, path, port):
+        self.path = path
+        self.gone = False
+        self._file = open(path, "wb")
+        self._lock = threading.Lock()
+        self._last = time.monotonic()
+        port_bytes = port.encode("utf-8")[:0xFFFF]
+        self._file.write(HEADER.pack(CAPTURE_MAGIC, time.time(), len(port_bytes)))
+        self._file.write(port_bytes)
+        self._file.flush()
+
+    def event(self, kind, data=b""):
+        if kind in DATA_EVENTS and not data:
+            return
+        with self._lock:
+            if self._file.closed:
+                return
+            if kind == b"G":
+                if self.gone:
+                    return
+                self.gone = True
+            elif kind == b"A":
+                self.gone = False
+            now = time.monotonic()
+            delta = min(int((now - self._last) * 1000000), 0xFFFFFFFF)
+            self._last = now
+            # Blocos maiores que o campo de tamanho viram eventos seguidos com delta 0.
+            chunks = [data[i:i + 0xFFFF] for i in range(0, len(data), 0xFFFF)] or [b""]
+            for chunk in chunks:
+                self._file.write(EVENT.pack(kind, delta, len(chunk)))
+                self._file.write(chunk)
+                delta = 0
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def journal_for(port, create=True):
+    directory = capture_dir()
+    if not directory:
+        return None
+    with _journals_lock:
+        journal = _journals.get(port)
+        if journal is None and create:
+            os.makedirs(directory, exist_ok=True)
+            journal = CaptureJournal(capture_path(directory, port), port)
+            _journals[port] = journal
+        return journal
+
+
+def port_gone(port):
+    journal = journal_for(port, create=False)
+    if journal:
+        journal.event(b"G")
+
+
+def port_back(old_port, new_port):
+    journal = journal_for(old_port, create=False)
+    if journal:
+        journal.event(b"A", new_port.encode("utf-8"))
+        with _journals_lock:
+            _journals[new_port] = journal
+
+
+@atexit.register
+def close_journals():
+    with _journals_lock:
+        for journal in set(_journals.values()):
+            journal.close()
+        _journals.clear()
+
+
+def read_capture(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, started, port_len = HEADER.unpack_from(data, 0)
+    if magic != CAPTURE_MAGIC:
+        raise ValueError(f"Arquivo de captura inválido: {path}")
+    offset = HEADER.size
+    port = data[offset:offset + port_len].decode("utf-8", errors="replace")
+    offset += port_len
+
+    events = []
+    elapsed = 0.0
+    while offset + EVENT.size <= len(data):
+        kind, delta, length = EVENT.unpack_from(data, offset)
+        offset += EVENT.size
+        payload = data[offset:offset + length]
+        offset += length
+        elapsed += delta / 1000000
+        events.append((elapsed, kind, payload))
+    return {"port": port, "started": started}, events
+
+
+# Uma thread lê a porta continuamente e marca cada bloco na chegada; o host
+# consome do buffer interno com a mesma semântica de timeout do pyserial.
+class RecordingSerial:
+    def __init__(self, ser, journal, timeout=None):
+        self._ser = ser
+        self._journal = journal
+        self.timeout = timeout
+        self._buffer = bytearray()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._error = None
+        ser.timeout = READ_SLICE
+        journal.event(b"O", str(ser.baudrate).encode("ascii"))
+        self._reader = threading.Thread(target=self._read_loop, name="RecordingSerial", daemon=True)
+        self._reader.start()
+
+    def _read_loop(self):
+        while not self._closed:
+            try:
+                data = self._ser.read(self._ser.in_waiting or 1)
+            except Exception as e:
+                if self._closed:
+                    return
+                self._journal.event(b"G")
+                with self._cond:
+                    self._error = e
+                    self._cond.notify_all()
+                return
+            if data:
+                with self._cond:
+                    self._journal.event(b"R", data)
+                    self._buffer.extend(data)
+                    self._cond.notify_all()
+
+    def _wait(self, ready):
+        end = None if self.timeout is None else time.monotonic() + self.timeout
+        while not ready() and self._error is None:
+            remaining = None if end is None else end - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            self._cond.wait(remaining)
+        if not self._buffer and self._error is not None:
+            raise serial.SerialException(f"Porta desconectada: {self._error}")
+
+    @property
+    def in_waiting(self):
+        with self._cond:
+            if not self._buffer and self._error is not None:
+                raise serial.SerialException(f"Porta desconectada: {self._error}")
+            return len(self._buffer)
+
+    def read(self, size=1):
+        with self._cond:
+            self._wait(lambda: len(self._buffer) >= size)
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            return data
+
+    def readline(self, size=-1):
+        with self._cond:
+            self._wait(lambda: b"\n" in self._buffer or 0 <= size <= len(self._buffer))
+            end = self._buffer.find(b"\n") + 1 or len(self._buffer)
+            if size >= 0:
+                end = min(end, size)
+            data = bytes(self._buffer[:end])
+            del self._buffer[:end]
+            return data
+
+    # Não repassa ao driver: o que ainda estiver lá chega pela thread e entra
+    # no registro; o que já chegou é descartado e registrado como "D".
+    def reset_input_buffer(self):
+        with self._cond:
+            self._journal.event(b"D", bytes(self._buffer))
+            self._buffer.clear()
+
+    def write(self, data):
+        self._journal.event(b"W", bytes(data))
+        return self._ser.write(data)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._reader.join(1.0)
+        try:
+            self._ser.close()
+        finally:
+            self._journal.event(b"C")
+
+    def __getattr__(self, name):
+        return getattr(self._ser, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_serial(port, baudrate=115200, **kwargs):
+    ser = serial.Serial(port, baudrate, **kwargs)
+    try:
+        journal = journal_for(port)
+    except OSError as e:
+        print(f"[serial_capture] Captura desativada: {e}")
+        return ser
+    if journal is None:
+        return ser
+    return RecordingSerial(ser, journal, kwargs.get("timeout"))
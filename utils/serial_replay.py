@@ -0,0 +1,193 @@
+import argparse
+import os
+import select
+import sys
+import time
+
+from utils.serial_capture import read_capture
+
+POLL_INTERVAL = 0.01
+HOST_WAIT = 30
+EVENT_NAMES = {
+    b"O": "abre", b"C": "fecha", b"W": "->", b"R": "<-", b"D": "<- (descartado)",
+    b"G": "porta sumiu", b"A": "porta voltou"
+}
+
+
+# Linux: enquanto nenhum processo tem o escravo aberto, o mestre sinaliza POLLHUP.
+# select.poll e tty só existem fora do Windows; --dump funciona em qualquer sistema.
+def _slave_open(master_fd):
+    poller = select.poll()
+    poller.register(master_fd, select.POLLIN | select.POLLHUP)
+    for _, mask in poller.poll(0):
+        if mask & select.POLLHUP:
+            return False
+    return True
+
+
+def _read_host(master_fd, timeout):
+    ready, _, _ = select.select([master_fd], [], [], max(timeout, 0))
+    if not ready:
+        return b""
+    try:
+        return os.read(master_fd, 4096)
+    except OSError:
+        time.sleep(timeout)
+        return b""
+
+
+class ReplayPort:
+    def __init__(self, link=None, log=print):
+        self.link = link
+        self.log = log
+        self.master_fd = None
+        self.slave_path = None
+
+    def create(self):
+        import tty
+
+        master_fd, slave_fd = os.openpty()
+        tty.setraw(slave_fd)
+        self.slave_path = os.ttyname(slave_fd)
+        os.close(slave_fd)
+        self.master_fd = master_fd
+        if self.link:
+            tmp = f"{self.link}.tmp"
+            if os.path.lexists(tmp):
+                os.remove(tmp)
+            os.symlink(self.slave_path, tmp)
+            os.replace(tmp, self.link)
+        return self.slave_path
+
+    # Fechar o mestre derruba o escravo: o host recebe o mesmo erro de E/S de
+    # uma placa desconectada.
+    def drop(self):
+        if self.master_fd is not None:
+            os.close(self.master_fd)
+            self.master_fd = None
+
+    def is_open(self):
+        return self.master_fd is not None and _slave_open(self.master_fd)
+
+    def wait_open(self, timeout=None):
+        end = None if timeout is None else time.monotonic() + timeout
+        while not self.is_open():
+            if end is not None and time.monotonic() > end:
+                return False
+            time.sleep(POLL_INTERVAL)
+        return True
+
+    def drain(self, timeout):
+        if self.master_fd is None:
+            time.sleep(max(timeout, 0))
+            return b""
+        return _read_host(self.master_fd, timeout)
+
+
+# A placa fala com o atraso registrado desde o último evento do host (abrir,
+# escrever, fechar); cada evento do host espera o host real fazer o mesmo.
+def replay(port, events, speed=1.0):
+    log = port.log
+    anchor_clock = time.monotonic()
+    anchor_offset = 0.0
+    received = b""
+
+    for offset, kind, payload in events:
+        if kind == b"O":
+            if not port.wait_open(HOST_WAIT):
+                log(f" host não abriu {port.slave_path} em {HOST_WAIT}s")
+                return False
+            received = b""
+        elif kind == b"W":
+            deadline = time.monotonic() + HOST_WAIT
+            while len(received) < len(payload):
+                if not port.is_open():
+                    log(" host fechou a porta durante a reprodução")
+                    return False
+                received += port.drain(POLL_INTERVAL * 10)
+                if time.monotonic() > deadline:
+                    log(f" host não enviou {payload!r} em {HOST_WAIT}s")
+                    return False
+            got, received = received[:len(payload)], received[len(payload):]
+            if got != payload:
+                log(f" divergência: esperado {payload!r}, recebido {got!r}")
+        elif kind == b"D":
+            # Os bytes já foram enviados como "R"; "D" só marca o descarte pelo host.
+            continue
+        elif kind == b"C":
+            deadline = time.monotonic() + HOST_WAIT
+            while port.is_open() and time.monotonic() < deadline:
+                port.drain(POLL_INTERVAL * 10)
+        else:
+            due = anchor_clock + (offset - anchor_offset) / speed
+            while True:
+                remaining = due - time.monotonic()
+                if remaining <= 0:
+                    break
+                received += port.drain(remaining)
+            if kind == b"R":
+                if port.master_fd is not None:
+                    os.write(port.master_fd, payload)
+            elif kind == b"G":
+                port.drop()
+                log(" porta removida")
+            elif kind == b"A":
+                port.drop()
+                log(f" porta reapareceu em {port.create()} (gravada como {payload.decode(errors='replace')})")
+            continue
+
+        anchor_clock = time.monotonic()
+        anchor_offset = offset
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m utils.serial_replay",
+        description="Reproduz uma captura serial (.spcap) em um pty do Linux."
+    )
+    parser.add_argument("capture")
+    parser.add_argument("--speed", type=float, default=1.0, help="fator de velocidade (2 = duas vezes mais rápido)")
+    parser.add_argument("--link", help="symlink mantido apontando para o pty atual (muda a cada reenumeração)")
+    parser.add_argument("--loop", action="store_true", help="repetir a captura ao terminar")
+    parser.add_argument("--dump", action="store_true", help="apenas listar os eventos da captura")
+    args = parser.parse_args(argv)
+
+    meta, events = read_capture(args.capture)
+    if args.dump:
+        print(f"{meta['port']}, {len(events)} eventos")
+        for offset, kind, payload in events:
+            name = EVENT_NAMES.get(kind, kind.decode(errors="replace"))
+            print(f"{offset * 1000:10.1f} ms {name:<16} {payload!r}" if payload else f"{offset * 1000:10.1f} ms {name}")
+        return 0
+
+    if not sys.platform.startswith("linux"):
+        print("A reprodução em pty só é suportada no Linux.")
+        return 1
+
+    port = ReplayPort(args.link, log=lambda message: print(message, flush=True))
+    slave_path = port.create()
+    print(f"Reproduzindo {os.path.basename(args.capture)} ({meta['port']}) em {slave_path}", flush=True)
+
+    try:
+        while True:
+            started = time.monotonic()
+            ok = replay(port, events, args.speed)
+            print(f" reprodução {'concluída' if ok else 'interrompida'} em {time.monotonic() - started:.3f}s",
+                  flush=True)
+            # Fechar o mestre antes do host descarta o que ele ainda não leu.
+            while port.is_open():
+                port.drain(POLL_INTERVAL * 10)
+            if not args.loop:
+                break
+            if port.master_fd is None:
+                print(f" nova porta em {port.create()}", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        port.drop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import json
+import os
+import tempfile
+import threading
+
+SETTINGS_VERSION = 2
+
+DEFAULT_SETTINGS = {
+    'arduino_path': '',
+    'selected_port': '',
+    'selected_brand': '',
+    'selected_model': '',
+    'upload_sketch': True,
+    'firmware_mode': 'universal',
+    'force_vid_pid': False,
+    'force_product_manufacturer': False,
+    'verify_bootloader_touch': False,
+    'verify_flash_fallback': False,
+    'force_full_apply': False
+}
+
+
+class SettingsStore:
+    def __init__(self, path="config.json", debounce=0.5):
+        self.path = path
+        self.debounce = debounce
+        self._data = None
+        self._dirty = False
+        self._timer = None
+        self._lock = threading.RLock()
+
+    def _ensure_loaded(self):
+        if self._data is None:
+            self._data = self._read()
+
+    def _read(self):
+        settings = dict(DEFAULT_SETTINGS)
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+                # Versões antigas gravavam o catálogo de perfis e o último perfil
+                # aplicado junto; só as chaves conhecidas são aproveitadas.
+                for key in DEFAULT_SETTINGS:
+                    if key in saved:
+                        settings[key] = saved[key]
+                if saved.get('version') != SETTINGS_VERSION:
+                    self._dirty = True
+        except Exception as e:
+            print(f"[SettingsStore] Erro ao ler {self.path}: {e}")
+        return settings
+
+    def get(self, key, default=None):
+        with self._lock:
+            self._ensure_loaded()
+            return self._data.get(key, default)
+
+    def as_dict(self):
+        with self._lock:
+            self._ensure_loaded()
+            return dict(self._data)
+
+    def set(self, key, value):
+        self.update({key: value})
+
+    def update(self, values):
+        with self._lock:
+            self._ensure_loaded()
+            changed = False
+            for key, value in values.items():
+                if key not in DEFAULT_SETTINGS:
+                    raise KeyError(f"Configuração desconhecida: {key}")
+                if self._data.get(key) != value:
+                    self._data[key] = value
+                    changed = True
+            if changed:
+                self._dirty = True
+                self._schedule_save()
+            return changed
+
+    def reload(self):
+        with self._lock:
+            self._cancel_timer()
+            self._dirty = False
+            self._data = self._read()
+            return dict(self._data)
+
+    def _cancel_timer(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def _schedule_save(self):
+        self._cancel_timer()
+        self._timer = threading.Timer(self.debounce, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            self._cancel_timer()
+            if not self._dirty or self._data is None:
+                return False
+            try:
+                self.save_now()
+                return True
+            except Exception as e:
+                print(f"[SettingsStore] Erro ao salvar {self.path}: {e}")
+                return False
+
+    def save_now(self):
+        with self._lock:
+            self._ensure_loaded()
+            payload = dict(self._data)
+            payload['version'] = SETTINGS_VERSION
+
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix=".config.", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(payload, f, indent=4)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self._dirty = False
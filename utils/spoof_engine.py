@@ -1,18 +1,61 @@
 import os
 import subprocess
 import json
+import threading
+import time
+
+from utils.file_watcher import FileWatcher
+from utils.latency_model import latency
+
+def default_profiles_path():
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.abspath(os.path.join(base_dir, "..", "mouse_profiles", "profiles.json"))
+
+def validate_profiles(data):
+    if not isinstance(data, dict):
+        raise ValueError("raiz deve ser um objeto {marca: {modelo: perfil}}")
+    for brand, models in data.items():
+        if not isinstance(models, dict):
+            raise ValueError(f"marca '{brand}' deve conter um objeto de modelos")
+        for model, profile in models.items():
+            if not isinstance(profile, dict):
+                raise ValueError(f"perfil '{brand}/{model}' deve ser um objeto")
+            for field in ("vid", "pid"):
+                try:
+                    int(profile[field], 16)
+                except (KeyError, TypeError, ValueError):
+                    raise ValueError(f"perfil '{brand}/{model}' com {field} ausente ou inválido")
+
+def diff_profiles(old, new):
+    old_keys = {(b, m) for b, models in old.items() for m in models}
+    new_keys = {(b, m) for b, models in new.items() for m in models}
+    return {
+        "added": sorted(new_keys - old_keys),
+        "removed": sorted(old_keys - new_keys),
+        "changed": sorted(k for k in old_keys & new_keys if old[k[0]][k[1]] != new[k[0]][k[1]])
+    }
+
+def usb_id(profile):
+    try:
+        return int(profile["vid"], 16), int(profile["pid"], 16)
+    except (KeyError, TypeError, ValueError):
+        return None
 
 class SpoofEngine:
     def __init__(self, serial_tool_path="utils/serial_tool.exe"):
         self.serial_tool_path = serial_tool_path
         self.port = None
+        self.profiles_path = default_profiles_path()
         self.profiles = self.load_profiles()
+        self.profiles_by_usb_id = {}
+        self._index_profiles(self.profiles, ((b, m) for b, models in self.profiles.items() for m in models))
+        self._profiles_lock = threading.Lock()
+        self._profiles_watcher = None
 
     def load_profiles(self, file_path=None):
         try:
             if file_path is None:
-                base_dir = os.path.dirname(os.path.abspath(__file__))
-                file_path = os.path.join(base_dir, "..", "mouse_profiles", "profiles.json")
+                file_path = default_profiles_path()
 
             file_path = os.path.abspath(file_path)
 
@@ -29,15 +72,79 @@ class SpoofEngine:
     def get_profile(self, brand, model):
         return self.profiles.get(brand, {}).get(model, None)
 
+    def find_profiles_by_usb_id(self, vid, pid):
+        return list(self.profiles_by_usb_id.get((vid, pid), []))
+
+    def _index_profiles(self, profiles, keys):
+        for brand, model in keys:
+            ident = usb_id(profiles[brand][model])
+            if ident:
+                self.profiles_by_usb_id.setdefault(ident, []).append((brand, model))
+
+    def _unindex_profiles(self, profiles, keys):
+        for brand, model in keys:
+            ident = usb_id(profiles[brand][model])
+            entries = self.profiles_by_usb_id.get(ident)
+            if entries and (brand, model) in entries:
+                entries.remove((brand, model))
+                if not entries:
+                    del self.profiles_by_usb_id[ident]
+
+    def read_profiles(self):
+        try:
+            with open(self.profiles_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            validate_profiles(data)
+            return True, "profiles.json recarregado", data
+        except Exception as e:
+            return False, f"profiles.json inválido, mantendo versão anterior: {e}", None
+
+    def apply_profiles(self, data):
+        with self._profiles_lock:
+            diff = diff_profiles(self.profiles, data)
+            self._unindex_profiles(self.profiles, diff["removed"] + diff["changed"])
+
+            # Atualiza o mesmo dicionário para quem guarda referência a ele.
+            for brand, model in diff["removed"]:
+                del self.profiles[brand][model]
+                if not self.profiles[brand]:
+                    del self.profiles[brand]
+            for brand, model in diff["added"] + diff["changed"]:
+                self.profiles.setdefault(brand, {})[model] = data[brand][model]
+
+            self._index_profiles(self.profiles, diff["added"] + diff["changed"])
+        return diff
+
+    def reload_profiles(self):
+        ok, msg, data = self.read_profiles()
+        if not ok:
+            return False, msg, None
+        return True, msg, self.apply_profiles(data)
+
+    # on_change(ok, mensagem, dados) roda na thread do watcher; quem tem
+    # interface deve chamar apply_profiles na própria thread.
+    def watch_profiles(self, on_change):
+        def _changed(path):
+            on_change(*self.read_profiles())
+
+        if self._profiles_watcher:
+            self._profiles_watcher.stop()
+        self._profiles_watcher = FileWatcher(_changed)
+        self._profiles_watcher.watch(self.profiles_path)
+
     def run_tool(self, args):
+        port = args[1] if len(args) > 1 else "serial_tool"
+        command = args[0] if args else None
         try:
             cmd = [self.serial_tool_path] + args
+            started = time.monotonic()
             result = subprocess.run(
                 cmd,
                 capture_output=True,
                 text=True,
-                timeout=5
+                timeout=latency.deadline(port, "tool", command=command)
             )
+            latency.observe(port, "tool", time.monotonic() - started, command=command)
             output = result.stdout.strip()
             error = result.stderr.strip()
 
@@ -48,6 +155,7 @@ class SpoofEngine:
 
             return True, output
         except subprocess.TimeoutExpired:
+            latency.timed_out(port, "tool", command=command)
             return False, "Timeout ao comunicar com serial_tool"
         except Exception as e:
             return False, str(e)
@@ -0,0 +1,135 @@
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+from utils.file_watcher import stat_signature
+
+BUNDLED_CLI_DIR = "utils"
+
+
+def parse_version(text):
+    # "1.8.10" > "1.8.6"; sufixos de pré-lançamento ("1.8.7-rc1") ficam abaixo
+    # da versão final correspondente.
+    main, _, suffix = text.partition("-")
+    parts = []
+    for piece in re.split(r"[.+]", main):
+        parts.append(int(piece) if piece.isdigit() else -1)
+    return tuple(parts), 0 if suffix else 1, suffix
+
+
+class ToolchainResolver:
+    def __init__(self, bundled_dir=BUNDLED_CLI_DIR):
+        self.bundled_dir = bundled_dir
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, name, signature, compute):
+        with self._lock:
+            entry = self._cache.get(name)
+            if entry and entry[0] == signature:
+                return entry[1]
+        value = compute()
+        with self._lock:
+            self._cache[name] = (signature, value)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._cache.clear()
+
+    def cli_path(self):
+        names = ["arduino-cli.exe", "arduino-cli"] if os.name == "nt" else ["arduino-cli", "arduino-cli.exe"]
+        bundled = [os.path.abspath(os.path.join(self.bundled_dir, n)) for n in names]
+        signature = (tuple(stat_signature(p) for p in bundled), os.environ.get("PATH", ""))
+
+        def _resolve():
+            for path in bundled:
+                if os.path.isfile(path) and (os.name == "nt" or os.access(path, os.X_OK)):
+                    return path
+            return shutil.which("arduino-cli")
+
+        return self._cached("cli", signature, _resolve)
+
+    def cli_version(self):
+        path = self.cli_path()
+        if not path:
+            return None
+
+        def _query():
+            try:
+                result = subprocess.run([path, "version"], capture_output=True, text=True, timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                return None
+            match = re.search(r"Version:\s*(\S+)", result.stdout)
+            return match.group(1) if match else result.stdout.strip() or None
+
+        return self._cached(("cli_version", path), stat_signature(path), _query)
+
+    def data_dir(self):
+        override = os.environ.get("ARDUINO_DIRECTORIES_DATA")
+        if override:
+            return override
+        home = os.path.expanduser("~")
+        if os.name == "nt":
+            local = os.environ.get("LOCALAPPDATA") or os.path.join(home, "AppData", "Local")
+            return os.path.join(local, "Arduino15")
+        if sys.platform == "darwin":
+            return os.path.join(home, "Library", "Arduino15")
+        return os.path.join(home, ".arduino15")
+
+    def avr_core_root(self):
+        return os.path.join(self.data_dir(), "packages", "arduino", "hardware", "avr")
+
+    def avr_core_versions(self):
+        root = self.avr_core_root()
+
+        def _scan():
+            if not os.path.isdir(root):
+                return []
+            versions = [v for v in os.listdir(root) if os.path.isdir(os.path.join(root, v))]
+            versions.sort(key=parse_version, reverse=True)
+            return [(v, os.path.join(root, v)) for v in versions]
+
+        return self._cached(("avr", root), stat_signature(root), _scan)
+
+    def avr_core_path(self):
+        for _, path in self.avr_core_versions():
+            if os.path.exists(os.path.join(path, "boards.txt")):
+                return path
+        return None
+
+    def avr_core_version(self, core_path):
+        for version, path in self.avr_core_versions():
+            if os.path.normcase(os.path.abspath(path)) == os.path.normcase(os.path.abspath(core_path)):
+                return version
+        return None
+
+    def temp_dirs(self):
+        bases = [os.path.join(tempfile.gettempdir(), "arduino")]
+        if os.name == "nt":
+            for var in ("TEMP", "TMP"):
+                if os.environ.get(var):
+                    bases.append(os.path.join(os.environ[var], "arduino"))
+            if os.environ.get("LOCALAPPDATA"):
+                bases.append(os.path.join(os.environ["LOCALAPPDATA"], "Temp", "arduino"))
+        else:
+            cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+            bases.append(os.path.join(cache_home, "arduino"))
+
+        dirs = []
+        seen = set()
+        for base in bases:
+            for sub in ("sketches", "cores"):
+                path = os.path.join(base, sub)
+                key = os.path.normcase(os.path.abspath(path))
+                if key not in seen:
+                    seen.add(key)
+                    dirs.append(path)
+        return dirs
+
+
+toolchain = ToolchainResolver()
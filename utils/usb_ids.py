@@ -0,0 +1,186 @@
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+USB_IDS_PATHS = [
+    "/usr/share/hwdata/usb.ids",
+    "/usr/share/misc/usb.ids",
+    "/usr/share/usb.ids",
+    "/var/lib/usbutils/usb.ids",
+    os.path.join("utils", "usb.ids")
+]
+
+INDEX_MAGIC = b"USBIDX1\0"
+# magic, mtime_ns e tamanho da fonte, contagens e offsets das seções
+HEADER = struct.Struct("<8sQQIIIII")
+VENDOR = struct.Struct("<HIH")
+PRODUCT = struct.Struct("<HHIH")
+
+
+def find_usb_ids():
+    candidates = [os.environ.get("USB_IDS")] + USB_IDS_PATHS
+    for path in candidates:
+        if path and os.path.isfile(path):
+            return os.path.abspath(path)
+    return None
+
+
+def default_cache_dir():
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or tempfile.gettempdir()
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "arduino-spoofer")
+
+
+def build_index(source, target):
+    st = os.stat(source)
+    vendors = []
+    products = []
+    strings = bytearray()
+    offsets = {}
+
+    def intern(name):
+        data = name.encode("utf-8")[:0xFFFF]
+        if data not in offsets:
+            offsets[data] = len(strings)
+            strings.extend(data)
+        return offsets[data], len(data)
+
+    vendor = None
+    with open(source, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            if line.startswith("\t\t"):
+                continue
+            if line.startswith("\t"):
+                if vendor is None:
+                    continue
+                ident, _, name = line.strip().partition(" ")
+                try:
+                    products.append((vendor, int(ident, 16)) + intern(name.strip()))
+                except ValueError:
+                    continue
+                continue
+
+            ident, _, name = line.rstrip("\n").partition(" ")
+            # Depois dos fabricantes vêm classes, HID etc. ("C 00 ...").
+            if len(ident) != 4:
+                break
+            try:
+                vendor = int(ident, 16)
+            except ValueError:
+                break
+            vendors.append((vendor,) + intern(name.strip()))
+
+    vendors.sort()
+    products.sort()
+
+    vendors_off = HEADER.size
+    products_off = vendors_off + VENDOR.size * len(vendors)
+    strings_off = products_off + PRODUCT.size * len(products)
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".usbidx.", dir=os.path.dirname(target))
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(HEADER.pack(INDEX_MAGIC, st.st_mtime_ns, st.st_size, len(vendors),
+                                  len(products), vendors_off, products_off, strings_off))
+            for record in vendors:
+                out.write(VENDOR.pack(*record))
+            for record in products:
+                out.write(PRODUCT.pack(*record))
+            out.write(strings)
+        os.replace(tmp_path, target)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class UsbIdsIndex:
+    def __init__(self, index_path):
+        with open(index_path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.source_mtime_ns, self.source_size, self.vendor_count, self.product_count,
+         self._vendors_off, self._products_off, self._strings_off) = HEADER.unpack_from(self._map, 0)
+        if magic != INDEX_MAGIC:
+            self._map.close()
+            raise ValueError(f"Índice usb.ids inválido: {index_path}")
+
+    @classmethod
+    def open(cls, source=None, cache_dir=None):
+        source = source or find_usb_ids()
+        if not source:
+            return None
+        index_path = os.path.join(cache_dir or default_cache_dir(), "usb.ids.idx")
+        st = os.stat(source)
+
+        if os.path.exists(index_path):
+            try:
+                index = cls(index_path)
+                if (index.source_mtime_ns, index.source_size) == (st.st_mtime_ns, st.st_size):
+                    return index
+                index.close()
+            except (OSError, ValueError, struct.error):
+                pass
+
+        build_index(source, index_path)
+        return cls(index_path)
+
+    def close(self):
+        self._map.close()
+
+    def _string(self, offset, length):
+        start = self._strings_off + offset
+        return self._map[start:start + length].decode("utf-8", errors="replace")
+
+    def _search(self, base, record, count, key, key_len):
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            fields = record.unpack_from(self._map, base + mid * record.size)
+            current = fields[:key_len]
+            if current < key:
+                lo = mid + 1
+            elif current > key:
+                hi = mid
+            else:
+                return fields
+        return None
+
+    def vendor_name(self, vid):
+        fields = self._search(self._vendors_off, VENDOR, self.vendor_count, (vid,), 1)
+        return self._string(fields[1], fields[2]) if fields else None
+
+    def product_name(self, vid, pid):
+        fields = self._search(self._products_off, PRODUCT, self.product_count, (vid, pid), 2)
+        return self._string(fields[2], fields[3]) if fields else None
+
+
+_index = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index, _index_loaded
+    with _index_lock:
+        if not _index_loaded:
+            _index_loaded = True
+            try:
+                _index = UsbIdsIndex.open()
+            except Exception as e:
+                print(f"[usb_ids] Índice indisponível: {e}")
+                _index = None
+        return _index
+
+
+def lookup_usb_names(vid, pid):
+    index = get_index()
+    if index is None or vid is None:
+        return None, None
+    return index.vendor_name(vid), index.product_name(vid, pid) if pid is not None else None